@@ -0,0 +1,50 @@
+# coding=utf-8
+"""Mide cuánto tarda evaluar un programa con muchas figuras con estilo.
+
+    python benchmarks/bench_evaluate.py [figuras] [repeticiones]
+
+El programa se parsea una sola vez; sólo se mide Program.evaluate.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from dibu.parser import get_lexer, get_parser
+
+SHAPES = [
+    'rectangle upper_left=(%d,0), size=(20, 20), fill="red", stroke="black", stroke-width="2"',
+    'circle center=(%d,50), radius=10, fill="blue", style="stroke: black; fill: none;"',
+    'ellipse center=(%d,80), rx=10, ry=5, stroke="green", stroke-width="1"',
+    'line from=(%d,0), to=(10, 10), stroke="black", style="stroke-width: 3;"',
+    'polygon points=[(%d,0), (50, 50), (0, 100)], fill="yellow", stroke="black"',
+    'text t="hola", at=(%d, 20), font-family="bakbatn", font-size="12"',
+]
+
+
+def program(shapes):
+    return ' '.join(SHAPES[i % len(SHAPES)] % (i % 200) for i in range(shapes))
+
+
+def main():
+    shapes = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    abstract_syntax_tree = get_parser().parse(program(shapes), get_lexer())
+    parameters = sum(len(line.parameters) for line in abstract_syntax_tree.lines)
+
+    best = None
+    for _ in range(repetitions):
+        start = time.time()
+        abstract_syntax_tree.evaluate()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    print('%d figuras, %d parámetros' % (shapes, parameters))
+    print('evaluate: %.1f ms, %.0f figuras/s, %.2f us por parámetro' % (
+        best * 1000, shapes / best, best / parameters * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+# coding=utf-8
+"""Mide tokens por segundo del lexer de PLY y del Scanner.
+
+    python benchmarks/bench_lexer.py [repeticiones]
+
+Usa el tablero de ajedrez de dibu/lexer.py, repetido para que el texto sea
+largo.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from dibu.lexer import CHECKERBOARD
+from dibu.parser import get_lexer
+
+
+def tokens_per_second(lexer, text):
+    start = time.time()
+    lexer.input(text)
+    count = 0
+    for _ in lexer:
+        count += 1
+    return count, count / (time.time() - start)
+
+
+def main():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    text = ' '.join([CHECKERBOARD] * repetitions)
+
+    for engine in ('ply', 'fast'):
+        count, speed = tokens_per_second(get_lexer(engine), text)
+        print('%-6s %8d tokens %12.0f tokens/s' % (engine, count, speed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# coding=utf-8
+"""Compara la evaluación en serie y en paralelo de un programa enorme.
+
+    python benchmarks/bench_parallel.py [figuras] [workers ...]
+
+El programa se arma directamente como AST (parsear medio millón de figuras
+con PLY lleva más que evaluarlas) y se evalúa con cada cantidad de workers.
+"""
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from dibu.expressions import CodeLine, Parameter, Program
+
+
+def program(shapes):
+    abstract_syntax_tree = Program()
+    abstract_syntax_tree.add(CodeLine('size', [Parameter('height', 1000), Parameter('width', 1000)]))
+    for i in range(shapes):
+        if i % 3 == 0:
+            parameters = [Parameter('center', (i % 1000, i % 700)), Parameter('radius', 5),
+                          Parameter('fill', '"red"'), Parameter('stroke', '"black"')]
+            identifier = 'circle'
+        elif i % 3 == 1:
+            parameters = [Parameter('upper_left', (i % 1000, i % 500)), Parameter('size', (10, 10)),
+                          Parameter('style', '"stroke: black; fill: none;"')]
+            identifier = 'rectangle'
+        else:
+            parameters = [Parameter('points', [(i % 1000, 0), (50, 50), (0, i % 100)]),
+                          Parameter('stroke-width', '"2"')]
+            identifier = 'polyline'
+        abstract_syntax_tree.add(CodeLine(identifier, parameters))
+    return abstract_syntax_tree
+
+
+def main():
+    shapes = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    workers = map(int, sys.argv[2:]) or sorted(set([2, multiprocessing.cpu_count()]))
+
+    abstract_syntax_tree = program(shapes)
+    start = time.time()
+    expected = abstract_syntax_tree.evaluate()
+    serial = time.time() - start
+    print('%d figuras, %d CPUs' % (shapes, multiprocessing.cpu_count()))
+    print('%-10s %10.2f s' % ('serie', serial))
+
+    for count in workers:
+        start = time.time()
+        result = abstract_syntax_tree.evaluate(workers=count)
+        elapsed = time.time() - start
+        assert result == expected
+        print('%-10s %10.2f s %8.2fx' % ('%d workers' % count, elapsed, serial / elapsed))
+
+
+if __name__ == '__main__':
+    main()
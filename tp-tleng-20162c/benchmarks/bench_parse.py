@@ -0,0 +1,57 @@
+# coding=utf-8
+"""Mide cuántas llamadas por segundo soporta dibu.parse.
+
+    python benchmarks/bench_parse.py [segundos]
+
+Compara construir el lexer y el parser en cada llamada (como se hacía
+antes) contra reusar las instancias cacheadas de dibu.parser.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ply.yacc as yacc
+from ply.lex import lex
+
+from dibu import lexer_rules, parser_rules
+from dibu.parser import parse
+
+PROGRAM = 'rectangle upper_left=(0,0), size=(200, 200), fill="yellow" ' \
+          'polygon points=[(0,0), (50, 50), (0, 100)], style="stroke: black; fill: none;" ' \
+          'circle center=(100,100), radius=20 ' \
+          'text t="esto es un texto", at=(10, 20) ' \
+          'size height=200, width=200'
+
+
+def parse_rebuilding(text):
+    lexer = lex(module=lexer_rules)
+    parser = yacc.yacc(module=parser_rules)
+    return parser.parse(text, lexer).evaluate()
+
+
+def calls_per_second(function, seconds):
+    calls = 0
+    start = time.time()
+    elapsed = 0
+    while elapsed < seconds:
+        function(PROGRAM)
+        calls += 1
+        elapsed = time.time() - start
+    return calls / elapsed
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+    assert parse_rebuilding(PROGRAM) == parse(PROGRAM)
+
+    before = calls_per_second(parse_rebuilding, seconds)
+    after = calls_per_second(parse, seconds)
+    print('%-22s %10.0f calls/s' % ('reconstruyendo', before))
+    print('%-22s %10.0f calls/s' % ('instancias cacheadas', after))
+    print('%-22s %10.1fx' % ('mejora', after / before))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+# coding=utf-8
+"""Compara guardar y formatear puntos como lista de tuplas o como Points.
+
+    python benchmarks/bench_points.py [puntos]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from dibu.emitters import EMITTERS
+from dibu.points import Points
+
+
+def tuples_size(points):
+    return sys.getsizeof(points) + sum(sys.getsizeof(point) + sum(sys.getsizeof(c) for c in point)
+                                       for point in points)
+
+
+def format_time(literal):
+    start = time.time()
+    result = EMITTERS['points'](literal)
+    return time.time() - start, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    # Coordenadas grandes para que no sean enteros cacheados por el intérprete.
+    tuples = [(1000 + i % 1000, 1000 + i % 777) for i in xrange(count)]
+    points = Points(tuples)
+
+    tuples_time, expected = format_time(tuples)
+    points_time, result = format_time(points)
+    assert result == expected
+
+    print('%d puntos' % count)
+    print('%-16s %14s %14s' % ('', 'bytes/punto', 'formato (s)'))
+    print('%-16s %14.1f %14.3f' % ('lista de tuplas', float(tuples_size(tuples)) / count, tuples_time))
+    print('%-16s %14.1f %14.3f' % ('Points', float(sys.getsizeof(points.coordinates)) / count, points_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+# coding=utf-8
+"""Compilador de directorios de Dibu.
+
+    dibu FUENTES [-o SALIDA] [-j PROCESOS] [--force]
+
+Compila cada archivo .dibu del árbol FUENTES a un .svg en el mismo lugar
+relativo de SALIDA (por defecto, al lado de la fuente), repartiendo los
+archivos entre todos los procesadores. En SALIDA queda un manifiesto con
+el hash del contenido de cada fuente compilada, y las que no cambiaron se
+saltean: si el tamaño y la fecha de modificación coinciden ni siquiera se
+leen, y si no coinciden se compara el hash. Los .svg de fuentes que se
+borraron o que ahora tienen errores se borran. Termina con estado 1 si algún
+archivo tiene errores.
+"""
+import argparse
+import errno
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from dibu.parser import parse
+
+EXTENSION = '.dibu'
+MANIFEST = '.dibu-manifest.json'
+
+
+def find_sources(source_dir):
+    """Devuelve los caminos relativos de las fuentes, ordenados."""
+    sources = []
+    for directory, _, files in os.walk(source_dir):
+        for name in files:
+            if name.endswith(EXTENSION):
+                sources.append(os.path.relpath(os.path.join(directory, name), source_dir))
+    return sorted(sources)
+
+
+def output_path(output_dir, source):
+    return os.path.join(output_dir, source[:-len(EXTENSION)] + '.svg')
+
+
+def load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def save_manifest(path, manifest):
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.rename(temporary, path)
+
+
+def compile_source(job):
+    """Compila una fuente. Devuelve (fuente, entrada del manifiesto, bytes
+    escritos, error), con error None si anduvo bien. Los errores de
+    entrada/salida también son errores de esa fuente, para no perder lo
+    compilado por las demás."""
+    source, source_path, svg_path, entry = job
+    try:
+        return _compile_source(source, source_path, svg_path, entry)
+    except (IOError, OSError) as e:
+        return source, None, None, '%s: %s' % (e.__class__.__name__, e)
+
+
+def _compile_source(source, source_path, svg_path, entry):
+    stat = os.stat(source_path)
+    if entry is not None and (entry['size'], entry['mtime']) == (stat.st_size, stat.st_mtime) \
+            and os.path.exists(svg_path):
+        return source, entry, None, None
+
+    with open(source_path) as f:
+        program = f.read()
+    digest = hashlib.sha1(program).hexdigest()
+    new_entry = {'sha1': digest, 'size': stat.st_size, 'mtime': stat.st_mtime}
+    if entry is not None and entry['sha1'] == digest and os.path.exists(svg_path):
+        return source, new_entry, None, None
+
+    try:
+        svg = parse(program)
+    except Exception as e:
+        return source, None, None, '%s: %s' % (e.__class__.__name__, e)
+
+    directory = os.path.dirname(svg_path)
+    if directory and not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # Otro proceso lo creó mientras tanto.
+            if not os.path.isdir(directory):
+                raise
+    temporary = svg_path + '.tmp'
+    try:
+        with open(temporary, 'w') as f:
+            f.write(svg)
+        os.rename(temporary, svg_path)
+    except (IOError, OSError):
+        remove(temporary)
+        raise
+    return source, new_entry, len(svg), None
+
+
+def remove(path):
+    try:
+        os.unlink(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+
+
+def compile_tree(source_dir, output_dir=None, jobs=None, force=False, out=sys.stdout, err=sys.stderr):
+    """Compila el árbol y devuelve la cantidad de fuentes con errores."""
+    if output_dir is None:
+        output_dir = source_dir
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    manifest_path = os.path.join(output_dir, MANIFEST)
+    previous = load_manifest(manifest_path)
+    manifest = {} if force else previous
+
+    start = time.time()
+    work = [(source, os.path.join(source_dir, source), output_path(output_dir, source), manifest.get(source))
+            for source in find_sources(source_dir)]
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+
+    if jobs > 1 and len(work) > 1:
+        pool = multiprocessing.Pool(jobs)
+        try:
+            results = list(pool.imap_unordered(compile_source, work, chunksize=8))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [compile_source(job) for job in work]
+
+    compiled = skipped = written = 0
+    failures = []
+    new_manifest = {}
+    for source, entry, size, error in sorted(results):
+        if error is not None:
+            failures.append((source, error))
+            continue
+        new_manifest[source] = entry
+        if size is None:
+            skipped += 1
+        else:
+            compiled += 1
+            written += size
+
+    # Los .svg de fuentes que se borraron o que ahora tienen errores ya no
+    # corresponden a nada. Sólo se tocan los que compilamos nosotros.
+    removed = 0
+    for source in sorted(set(previous) - set(new_manifest)):
+        try:
+            remove(output_path(output_dir, source))
+        except OSError as e:
+            err.write('%s: %s\n' % (output_path(output_dir, source), e))
+        else:
+            removed += 1
+    save_manifest(manifest_path, new_manifest)
+    elapsed = time.time() - start
+
+    for source, error in failures:
+        err.write('%s: %s\n' % (os.path.join(source_dir, source), error))
+    out.write('%d compilados, %d sin cambios, %d con errores, %d borrados en %.2f s '
+              '(%.1f archivos/s, %.0f KB escritos)\n' % (
+                  compiled, skipped, len(failures), removed, elapsed,
+                  compiled / elapsed if elapsed else 0.0, written / 1024.0))
+    return len(failures)
+
+
+def main():
+    argparser = argparse.ArgumentParser(prog='dibu', description='Compila programas de Dibu a SVG')
+    argparser.add_argument('source_dir', metavar='FUENTES', help='directorio con los archivos .dibu')
+    argparser.add_argument('-o', '--output-dir', metavar='SALIDA',
+                           help='directorio para los .svg (por defecto, FUENTES)')
+    argparser.add_argument('-j', '--jobs', type=int, default=None,
+                           help='cantidad de procesos (por defecto, uno por procesador)')
+    argparser.add_argument('--force', action='store_true', help='compilar todo, ignorando el manifiesto')
+    args = argparser.parse_args()
+
+    if not os.path.isdir(args.source_dir):
+        argparser.error('%s no es un directorio' % args.source_dir)
+    failures = compile_tree(args.source_dir, args.output_dir, args.jobs, args.force)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
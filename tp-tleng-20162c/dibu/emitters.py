@@ -0,0 +1,79 @@
+# coding=utf-8
+"""Emisores de los parámetros de Dibu.
+
+Por cada nombre de parámetro hay una función, armada una sola vez al
+importar, que chequea el tipo del literal y devuelve el atributo SVG.
+"""
+from dibu.exceptions import SyntacticException
+from dibu.points import Points
+
+NUMBER = (int, float)
+
+
+def _checked(parameter_name, types, emit):
+    types = frozenset(types)
+    message = "Tipo incorrecto para parámetro %s" % parameter_name
+
+    def emitter(literal):
+        if literal.__class__ not in types:
+            raise SyntacticException(message)
+        return emit(literal)
+    return emitter
+
+
+def _points(literal):
+    if literal.__class__ is Points:
+        return 'points="' + literal.format() + '"'
+    return 'points="' + ''.join('%s,%s ' % point for point in literal) + '"'
+
+
+def _coordinates(x, y):
+    template = x + '="%s" ' + y + '="%s"'
+
+    def emit(literal):
+        return template % (literal[0], literal[1])
+    return emit
+
+
+def _quoted(attribute):
+    template = attribute + '="%s"'
+
+    def emit(literal):
+        return template % (literal,)
+    return emit
+
+
+def _assignment(attribute):
+    prefix = attribute + '='
+
+    def emit(literal):
+        return prefix + literal
+    return emit
+
+
+def _text_style(attribute):
+    prefix = attribute + '='
+
+    def emit(literal):
+        return prefix + literal[1:-1]
+    return emit
+
+
+EMITTERS = dict((parameter_name, _checked(parameter_name, types, emit)) for parameter_name, types, emit in [
+    ('points', [list, Points], _points),
+    ('style', [str], _assignment('style')),
+    ('fill', [str], _assignment('fill')),
+    ('size', [tuple], _coordinates('height', 'width')),
+    ('upper_left', [tuple], _coordinates('x', 'y')),
+    ('from', [tuple], _coordinates('x1', 'y1')),
+    ('to', [tuple], _coordinates('x2', 'y2')),
+    ('center', [tuple], _coordinates('cx', 'cy')),
+    ('radius', NUMBER, _quoted('radius')),
+    ('rx', NUMBER, _quoted('rx')),
+    ('ry', NUMBER, _quoted('ry')),
+    ('at', [tuple], _coordinates('x', 'y')),
+    ('font-size', [str], _text_style('font-size')),
+    ('font-family', [str], _text_style('font-family')),
+    ('stroke', [str], _assignment('stroke')),
+    ('stroke-width', [str], _quoted('stroke-width')),
+])
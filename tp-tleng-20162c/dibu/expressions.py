@@ -1,17 +1,75 @@
 # coding=utf-8
-from dibu.exceptions import SemanticException, SyntacticException
+from dibu import instrument
+from dibu.emitters import EMITTERS
+from dibu.exceptions import SemanticException
+from dibu.parallel import CHUNK_SIZE, evaluate_code_lines
+from dibu.shapes import shape_for
 
 
 class Program(object):
     def __init__(self):
         self.lines = []
+        self.size_line = None
 
     def add(self, code_line):
-        # CodeLineValidator().validate(code_line)
+        if code_line.identifier == 'size':
+            if self.size_line is not None:
+                raise SemanticException('No puede haber más de una línea "size"')
+            self.size_line = code_line
         self.lines.append(code_line)
 
-    def evaluate(self):
-        return self.header() + self.evaluate_code_lines() + self.footer()
+    def evaluate(self, workers=1, chunk_size=CHUNK_SIZE, record=None):
+        """Devuelve el SVG del programa. Con workers distinto de 1 las líneas
+        se evalúan en paralelo, ver dibu.parallel.
+
+        La evaluación se mide en record, o si no se pasa y hay hooks de
+        instrumentación, en un record propio (ver dibu.instrument)."""
+        if record is not None:
+            return self._evaluate_recorded(workers, chunk_size, record)
+        record = instrument.start('dibu')
+        if record is None:
+            return self._evaluate(workers, chunk_size)
+        with record:
+            return self._evaluate_recorded(workers, chunk_size, record)
+
+    def _evaluate_recorded(self, workers, chunk_size, record):
+        svg = self._evaluate(workers, chunk_size)
+        record.phase('evaluate')
+        record.count('lines', len(self.lines))
+        record.count('parameters', sum(len(code_line.parameters) for code_line in self.lines))
+        record.count('bytes', len(svg))
+        return svg
+
+    def _evaluate(self, workers, chunk_size):
+        if workers == 1:
+            return ''.join(self.iter_svg())
+        header = self.header()
+        lines = self.lines
+        if self.size_line is not None:
+            lines = [code_line for code_line in lines if code_line is not self.size_line]
+        return header + evaluate_code_lines(lines, workers, chunk_size) + self.footer()
+
+    def iter_svg(self):
+        """Genera el SVG de a pedazos: el encabezado, cada figura y el cierre.
+
+        Cada figura se evalúa recién cuando se pide su pedazo, así que un
+        error semántico en una línea aparece después de haber generado las
+        anteriores."""
+        yield self.header()
+        size_line = self.size_line
+        for code_line in self.lines:
+            if code_line is size_line:
+                # No dibuja nada y ya se validó al armar el encabezado.
+                continue
+            shape = code_line.evaluate()
+            if shape:
+                yield shape
+        yield self.footer()
+
+    def write_to(self, fileobj):
+        """Escribe el SVG en fileobj a medida que se genera."""
+        for chunk in self.iter_svg():
+            fileobj.write(chunk)
 
     def header(self):
         height, width = self.size_in_code_lines()
@@ -20,22 +78,12 @@ class Program(object):
     def footer(self):
         return '</svg>'
 
-    def evaluate_code_lines(self):
-        result = ""
-        for code_line in self.lines:
-            result += code_line.evaluate()
-        return result
-
     def size_in_code_lines(self):
-        size_lines = filter(lambda line: line.identifier == 'size', self.lines)
-        if len(size_lines) > 1:
-            raise SemanticException('No puede haber más de una línea "size"')
-        elif len(size_lines) == 1:
-            height = filter(lambda parameter: parameter.parameter_name == 'height', size_lines[0].parameters)[0].literal
-            width = filter(lambda parameter: parameter.parameter_name == 'width', size_lines[0].parameters)[0].literal
-            return str(height), str(width)
-        else:
+        if self.size_line is None:
             return "200", "200"
+        self.size_line.validate_correct_code_line()
+        literals = dict((parameter.parameter_name, parameter.literal) for parameter in self.size_line.parameters)
+        return str(literals['height']), str(literals['width'])
 
 
 class CodeLine(object):
@@ -43,51 +91,20 @@ class CodeLine(object):
         self.identifier = identifier
         self.parameters = parameters
 
-    def identifier_translations(self):
-        return {'polygon': 'polygon',
-                'rectangle': 'rect',
-                'line': 'line',
-                'circle': 'circle',
-                'ellipse': 'ellipse',
-                'polyline': 'polyline',
-                'text': 'text'}
-
-    def obligatory_parameters_for_identifier(self):
-        return {'polygon': ['points'],
-                'rectangle': ['upper_left', 'size'],
-                'line': ['from', 'to'],
-                'circle': ['center', 'radius'],
-                'ellipse': ['center', 'rx', 'ry'],
-                'polyline': ['points'],
-                'text': ['t', 'at'],
-                'size': ['height', 'width']}
-
-    def valid_parameters(self):
-        return {'polygon': ['points', 'fill', 'stroke', 'stroke-width', 'style'],
-                'rectangle': ['upper_left', 'size', 'fill', 'stroke', 'stroke-width', 'style'],
-                'line': ['from', 'to', 'fill', 'stroke', 'stroke-width', 'style'],
-                'circle': ['center', 'radius', 'fill', 'stroke', 'stroke-width', 'style'],
-                'ellipse': ['center', 'rx', 'ry', 'fill', 'stroke', 'stroke-width', 'style'],
-                'polyline': ['points', 'fill', 'stroke', 'stroke-width', 'style'],
-                'text': ['t', 'at', 'font-family', 'font-size', 'fill', 'stroke', 'stroke-width', 'style'],
-                'size': ['height', 'width', 'fill', 'stroke', 'stroke-width', 'style']}
-
     def evaluate(self):
         self.validate_correct_code_line()
+        shape = shape_for(self.identifier)
 
         if self.identifier == 'text':
-            return "<" + self.identifier_translations()[
-                self.identifier] + ' ' + self.evaluate_parameters_of_text() + ">" + self.evaluate_text() + '</text>'
-        elif self.identifier == 'size':
+            return "<" + shape.tag + ' ' + self.evaluate_parameters_of_text() + ">" + self.evaluate_text() + '</text>'
+        elif shape.tag is None:
             return ""
         else:
-            return "<" + self.identifier_translations()[self.identifier] + ' ' + self.evaluate_parameters() + "/>"
+            return "<" + shape.tag + ' ' + self.evaluate_parameters(shape.emitters) + "/>"
 
-    def evaluate_parameters(self):
-        result = ""
-        for parameter in self.parameters:
-            result += parameter.evaluate() + ' '
-        return result
+    def evaluate_parameters(self, emitters):
+        return ''.join(emitters[parameter.parameter_name](parameter.literal) + ' '
+                       for parameter in self.parameters)
 
     def evaluate_parameters_of_text(self):
         result = ""
@@ -106,10 +123,8 @@ class CodeLine(object):
             lambda parameter: parameter.parameter_name == 'font-size' or parameter.parameter_name == 'font-family',
             self.parameters)
         if len(text_optional_parameters) > 0:
-            optional_parameters_result = 'style="'
-            for optional_parameter in text_optional_parameters:
-                optional_parameters_result += optional_parameter.evaluate() + ';'
-            optional_parameters_result += '"'
+            optional_parameters_result = 'style="' + ''.join(
+                optional_parameter.evaluate() + ';' for optional_parameter in text_optional_parameters) + '"'
 
         return optional_parameters_result
 
@@ -120,28 +135,31 @@ class CodeLine(object):
         raise SemanticException('Text debe tener el parámetro "t"')
 
     def validate_correct_code_line(self):
-        self._validate_obligatory_parameters_are_in_code_line()
-        self._validate_only_valid_parameter_are_in_code_line()
-        self._validate_not_duplicated_parameters()
-
-    def _validate_obligatory_parameters_are_in_code_line(self):
-        for parameter in self.obligatory_parameters_for_identifier()[self.identifier]:
-            if parameter not in map(lambda parameter: parameter.parameter_name, self.parameters):
-                raise SemanticException(
-                    'El parámetro %s no está en la línea de código y es obligatorio.' % parameter)
-
-    def _validate_not_duplicated_parameters(self):
-        parameters_names = map(lambda parameter: parameter.parameter_name, self.parameters)
-        for parameter_name in parameters_names:
-            if len(filter(lambda param_name: param_name == parameter_name, parameters_names)) > 1:
-                raise SemanticException('El parámetro %s está duplicado.' % parameter_name)
-
-    def _validate_only_valid_parameter_are_in_code_line(self):
-        for parameter in self.parameters:
-            if parameter.parameter_name not in self.valid_parameters()[self.identifier]:
+        shape = shape_for(self.identifier)
+        first_position = {}
+        invalid = None
+        duplicated_position = None
+        for position, parameter in enumerate(self.parameters):
+            parameter_name = parameter.parameter_name
+            if parameter_name not in shape.valid_parameters:
+                if invalid is None:
+                    invalid = parameter_name
+            elif parameter_name in first_position:
+                if duplicated_position is None or first_position[parameter_name] < duplicated_position:
+                    duplicated_position = first_position[parameter_name]
+            else:
+                first_position[parameter_name] = position
+
+        for parameter_name in shape.obligatory_parameters:
+            if parameter_name not in first_position:
                 raise SemanticException(
-                    'El parámetro %s no es válido para el identificador %s' % (
-                        parameter.parameter_name, self.identifier))
+                    'El parámetro %s no está en la línea de código y es obligatorio.' % parameter_name)
+        if invalid is not None:
+            raise SemanticException(
+                'El parámetro %s no es válido para el identificador %s' % (invalid, self.identifier))
+        if duplicated_position is not None:
+            raise SemanticException(
+                'El parámetro %s está duplicado.' % self.parameters[duplicated_position].parameter_name)
 
 
 class Parameter(object):
@@ -149,98 +167,5 @@ class Parameter(object):
         self.parameter_name = parameter_name
         self.literal = literal
 
-    def parameter_function(self):
-        return {'points': self.points_evaluate,
-                'style': self.style_evaluate,
-                'fill': self.fill_evaluate,
-                'size': self.size_evaluate,
-                'upper_left': self.upper_left_evaluate,
-                'from': self.from_evaluate,
-                'to': self.to_evaluate,
-                'center': self.center_evaluate,
-                'radius': self.radius_evaluate,
-                'rx': self.rx_evaluate,
-                'ry': self.ry_evaluate,
-                'at': self.at_evaluate,
-                'font-size': self.optional_text_parameter_evaluate,
-                'font-family': self.optional_text_parameter_evaluate,
-                'stroke': self.stroke_evaluate,
-                'stroke-width': self.stroke_width_evaluate}
-
-    def literal_type(self):
-        return {
-                'points': [list],
-                'style': [str],
-                'fill': [str],
-                'size': [tuple],
-                'upper_left': [tuple],
-                'from': [tuple],
-                'to': [tuple],
-                'center': [tuple],
-                'radius': [int, float],
-                'rx': [int, float],
-                'ry': [int, float],
-                'at': [tuple],
-                'font-size': [str],
-                'font-family': [str],
-                'stroke': [str],
-                'stroke-width': [str]
-
-        }
-
     def evaluate(self):
-        self.validate_correct_parameter_types()
-        return self.parameter_function()[self.parameter_name]()
-
-    def validate_correct_parameter_types(self):
-        if self.literal.__class__ not in self.literal_type()[self.parameter_name]:
-            raise SyntacticException("Tipo incorrecto para parámetro %s" % self.parameter_name)
-
-    def points_evaluate(self):
-        result = 'points="'
-        for point in self.literal:
-            result += '%s,%s' % point + ' '
-        result += '"'
-        return result
-
-    def style_evaluate(self):
-        return 'style=' + self.literal
-
-    def fill_evaluate(self):
-        return 'fill=' + self.literal
-
-    def size_evaluate(self):
-        return 'height="%s"' % self.literal[0] + ' width="%s"' % self.literal[1]
-
-    def upper_left_evaluate(self):
-        return 'x="%s"' % self.literal[0] + ' y="%s"' % self.literal[1]
-
-    def from_evaluate(self):
-        return 'x1="%s"' % self.literal[0] + ' y1="%s"' % self.literal[1]
-
-    def to_evaluate(self):
-        return 'x2="%s"' % self.literal[0] + ' y2="%s"' % self.literal[1]
-
-    def center_evaluate(self):
-        return 'cx="%s"' % self.literal[0] + ' cy="%s"' % self.literal[1]
-
-    def radius_evaluate(self):
-        return 'radius="%s"' % self.literal
-
-    def rx_evaluate(self):
-        return 'rx="%s"' % self.literal
-
-    def ry_evaluate(self):
-        return 'ry="%s"' % self.literal
-
-    def at_evaluate(self):
-        return 'x="%s"' % self.literal[0] + ' y="%s"' % self.literal[1]
-
-    def optional_text_parameter_evaluate(self):
-        return self.parameter_name + '=' + self.literal[1:-1]
-
-    def stroke_evaluate(self):
-        return 'stroke=%s' % self.literal
-
-    def stroke_width_evaluate(self):
-        return 'stroke-width="%s"' % str(self.literal)
+        return EMITTERS[self.parameter_name](self.literal)
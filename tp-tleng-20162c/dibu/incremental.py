@@ -0,0 +1,95 @@
+# coding=utf-8
+"""Evaluación incremental para volver a correr dibujos que cambian poco.
+
+LineCache parte el programa en líneas de código a partir de sus tokens y
+guarda, para cada línea, el CodeLine ya validado y su pedazo de SVG, usando
+los tokens de la línea como clave. Al volver a correr el programa sólo se
+parsean y evalúan las líneas que cambiaron. La cache tiene un tamaño máximo
+y descarta las líneas usadas menos recientemente.
+
+Si el programa tiene algún error se lo procesa entero como siempre, así que
+las excepciones son exactamente las mismas que las de dibu.parse.
+"""
+import functools
+from collections import OrderedDict
+
+from dibu.exceptions import SemanticException, SyntacticException
+from dibu.expressions import Program
+from dibu.parser import get_lexer, get_parser
+
+IDENTIFIERS = frozenset(['SIZE', 'RECTANGLE', 'LINE', 'CIRCLE', 'ELLIPSE', 'POLYLINE', 'POLYGON', 'TEXT'])
+# Una línea termina en un literal, así que un identificador que viene
+# después de uno de estos tokens empieza una línea nueva. Si viene después
+# del identificador de la línea o de una coma es un nombre de parámetro
+# (size puede ser las dos cosas).
+LITERAL_ENDS = frozenset(['NUMBER', 'POINT', 'STRING', 'R_SQUARE_BRACKET'])
+
+
+def split_code_lines(tokens):
+    """Agrupa los tokens de un programa válido en las líneas de código."""
+    lines = []
+    previous = None
+    for token in tokens:
+        if not lines or (token.type in IDENTIFIERS and previous in LITERAL_ENDS):
+            lines.append([])
+        lines[-1].append(token)
+        previous = token.type
+    return lines
+
+
+class LineCache(object):
+    def __init__(self, maxsize=10000, engine='fast'):
+        self.maxsize = maxsize
+        self.engine = engine
+        self.lines = OrderedDict()
+        self.hits = self.misses = self.evictions = self.fallbacks = 0
+
+    def render(self, source):
+        """Devuelve el SVG del programa, igual que dibu.parse."""
+        try:
+            return self._render(source)
+        except (SyntacticException, SemanticException):
+            self.fallbacks += 1
+            lexer = get_lexer(self.engine)
+            lexer.lineno = 1
+            return get_parser().parse(source, lexer).evaluate()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'fallbacks': self.fallbacks, 'size': len(self.lines),
+                'hit_rate': float(self.hits) / lookups if lookups else 0.0}
+
+    def _render(self, source):
+        lexer = get_lexer(self.engine)
+        lexer.lineno = 1
+        lexer.input(source)
+
+        program = Program()
+        fragments = []
+        for line_tokens in split_code_lines(lexer):
+            # La clase distingue radius=1 de radius=1.0, que son iguales como claves.
+            key = tuple((token.type, token.value.__class__, token.value) for token in line_tokens)
+            entry = self.lines.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                entry = self._evaluate_line(line_tokens)
+            else:
+                self.hits += 1
+            self.lines[key] = entry
+            if len(self.lines) > self.maxsize:
+                self.lines.popitem(last=False)
+                self.evictions += 1
+
+            code_line, fragment = entry
+            program.add(code_line)
+            fragments.append(fragment)
+
+        return program.header() + ''.join(fragments) + program.footer()
+
+    def _evaluate_line(self, line_tokens):
+        tokens = iter(line_tokens)
+        line_program = get_parser().parse(lexer=get_lexer(self.engine),
+                                          tokenfunc=functools.partial(next, tokens, None))
+        code_line, = line_program.lines
+        return code_line, code_line.evaluate()
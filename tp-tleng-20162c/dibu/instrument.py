@@ -0,0 +1,114 @@
+# coding=utf-8
+"""Instrumentación opcional de Dibu.
+
+    from dibu import instrument
+    instrument.add_hook(lambda record: sys.stderr.write('%r\\n' % record.as_dict()))
+
+Mientras haya algún hook registrado, cada programa que se evalúa (con
+dibu.parse o con Program.evaluate) llena un Record con el tiempo de cada
+fase (parse, que incluye el lexer, y evaluate), la cantidad de tokens, de
+líneas y de parámetros del programa y los bytes del SVG, y se lo pasa a cada
+hook al terminar, aunque el programa tenga errores. Sin hooks sólo se paga
+una comparación por programa.
+
+Python 2 no tiene tracemalloc: un hook registrado con memory=True recibe
+además el pico de memoria residente del proceso (resource.getrusage), que
+es el máximo de todo el proceso y no sólo de ese programa.
+"""
+import resource
+import time
+
+hooks = []
+_memory_hooks = []
+
+
+def add_hook(callback, memory=False):
+    hooks.append(callback)
+    if memory:
+        _memory_hooks.append(callback)
+
+
+def remove_hook(callback):
+    hooks.remove(callback)
+    if callback in _memory_hooks:
+        _memory_hooks.remove(callback)
+
+
+def start(pipeline):
+    """Devuelve un Record nuevo si hay hooks, y si no None."""
+    return Record(pipeline) if hooks else None
+
+
+class Record(object):
+    """Las mediciones de una evaluación.
+
+    Usado con with, cuenta el error si sale una excepción y al terminar se
+    lo pasa a los hooks."""
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.phases = []
+        self.counts = {}
+        self.peak_rss_kb = None
+        self._last = time.time()
+
+    def phase(self, name):
+        """Cierra la fase que empezó en la llamada anterior (o al crear el
+        record) y le pone nombre."""
+        now = time.time()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    def skip(self):
+        """Deja afuera de las fases el tiempo desde la última, para el
+        trabajo que sólo sirve para llenar el record."""
+        self._last = time.time()
+
+    def count(self, name, amount=1):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def counting(self, function, name):
+        # Envuelve una función que devuelve tokens o None, contando los tokens.
+        def counted():
+            result = function()
+            if result is not None:
+                self.counts[name] = self.counts.get(name, 0) + 1
+            return result
+        return counted
+
+    def total(self):
+        return sum(seconds for _, seconds in self.phases)
+
+    def as_dict(self):
+        record = {'pipeline': self.pipeline, 'phases': dict(self.phases),
+                  'counts': dict(self.counts), 'total': self.total()}
+        if self.peak_rss_kb is not None:
+            record['peak_rss_kb'] = self.peak_rss_kb
+        return record
+
+    def finish(self):
+        """Le pasa el record a los hooks."""
+        if _memory_hooks:
+            self.peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        for hook in list(hooks):
+            hook(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.count('errors')
+        self.finish()
+
+
+class CountingWriter(object):
+    """Le pasa las escrituras a f, contando los bytes en record."""
+
+    def __init__(self, f, record):
+        self.f = f
+        self.record = record
+
+    def write(self, data):
+        self.record.count('bytes', len(data))
+        self.f.write(data)
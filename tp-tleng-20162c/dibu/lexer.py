@@ -31,4 +31,5 @@ class Applier(object):
 
 # Build the lexer
 lexer = lex(module=lexer_rules)
-Applier().apply("size height=200, width=200 rectangle upper_left=(0,0), size=(50, 50), fill=\"red\" rectangle upper_left=(100,0), size=(50, 50) rectangle upper_left=(50,50), size=(50, 50) rectangle upper_left=(150,50), size=(50, 50) rectangle upper_left=(0,100), size=(50, 50) rectangle upper_left=(100,100), size=(50, 50) rectangle upper_left=(50,150), size=(50, 50) rectangle upper_left=(150,150), size=(50, 50)")
+CHECKERBOARD = "size height=200, width=200 rectangle upper_left=(0,0), size=(50, 50), fill=\"red\" rectangle upper_left=(100,0), size=(50, 50) rectangle upper_left=(50,50), size=(50, 50) rectangle upper_left=(150,50), size=(50, 50) rectangle upper_left=(0,100), size=(50, 50) rectangle upper_left=(100,100), size=(50, 50) rectangle upper_left=(50,150), size=(50, 50) rectangle upper_left=(150,150), size=(50, 50)"
+Applier().apply(CHECKERBOARD)
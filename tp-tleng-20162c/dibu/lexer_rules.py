@@ -1,3 +1,4 @@
+# coding=utf-8
 from dibu.exceptions import SyntacticException
 
 tokens = [
@@ -70,41 +71,58 @@ def t_POINT(token):
     return token
 
 
+# Las palabras reservadas se reconocen con una sola regla: se lee la palabra
+# entera y se busca en la tabla. Así "to" no es el prefijo de "toy" y no hay
+# que probar una expresión regular por palabra en cada posición.
+reserved = {
+    # METODOS
+    'size': 'SIZE',
+    'rectangle': 'RECTANGLE',
+    'line': 'LINE',
+    'circle': 'CIRCLE',
+    'ellipse': 'ELLIPSE',
+    'polyline': 'POLYLINE',
+    'polygon': 'POLYGON',
+    'text': 'TEXT',
+
+    # VARIABLES
+    'upper_left': 'UPPER_LEFT',
+    'height': 'HEIGHT',
+    'width': 'WIDTH',
+    'from': 'FROM',
+    'to': 'TO',
+    'center': 'CENTER',
+    'radius': 'RADIUS',
+    'rx': 'RX',
+    'ry': 'RY',
+    'points': 'POINTS',
+    't': 'T',
+    'at': 'AT',
+    'style': 'STYLE',
+
+    # VARIABLES OPCIONALES
+    'font-family': 'FONT_FAMILY',
+    'font-size': 'FONT_SIZE',
+    'fill': 'FILL',
+    'stroke': 'STROKE',
+    'stroke-width': 'STROKE_WIDTH',
+}
+
+
+def t_WORD(token):
+    r"[a-z_][a-z_-]*"
+    try:
+        token.type = reserved[token.value]
+    except KeyError:
+        raise SyntacticException("Palabra desconocida: %s (línea %s posición %s)" %
+                                 (token.value, token.lineno, token.lexpos))
+    return token
+
+
 t_L_SQUARE_BRACKET = r"\["
 t_R_SQUARE_BRACKET = r"\]"
 t_STRING = r'\"([a-z 0-9 , . : = ; -])*\"'
 t_EQUAL = r"="
 t_COMMA = r","
 
-t_SIZE = r"size"
-t_RECTANGLE = r"rectangle"
-t_LINE = r"line"
-t_CIRCLE = r"circle"
-t_ELLIPSE = r"ellipse"
-t_POLYLINE = r"polyline"
-t_POLYGON = r"polygon"
-t_TEXT = r"text"
-
-# VARIABLES
-t_UPPER_LEFT = r"upper_left"
-t_HEIGHT = r"height"
-t_WIDTH = r"width"
-t_FROM = r"from"
-t_TO = r"to"
-t_CENTER = r"center"
-t_RADIUS = r"radius"
-t_RX = r"rx"
-t_RY = r"ry"
-t_POINTS = r"points"
-t_T = r"t"
-t_AT = r"at"
-t_STYLE = r"style"
-
-# VARIABLES OPCIONALES
-t_FONT_FAMILY = r"font-family"
-t_FONT_SIZE = r"font-size"
-t_FILL = r"fill"
-t_STROKE = r"stroke"
-t_STROKE_WIDTH = r"stroke-width"
-
 t_ignore = " \t\n"
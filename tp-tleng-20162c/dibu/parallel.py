@@ -0,0 +1,58 @@
+# coding=utf-8
+"""Evaluación de programas grandes en varios procesos.
+
+Las líneas de código se evalúan de a bloques en un pool de procesos y los
+pedazos de SVG se juntan en el orden del programa. Donde los procesos se
+crean con fork, los workers heredan el programa (se lo pasa el
+inicializador del pool, así que varios threads pueden evaluar a la vez) y
+sólo reciben el rango de líneas de cada bloque; si no, se les manda el
+bloque entero.
+"""
+import multiprocessing
+import sys
+
+CHUNK_SIZE = 10000
+
+_FORK = sys.platform != 'win32'
+# En cada worker, el programa que se está evaluando.
+_lines = None
+
+
+def _start_worker(lines):
+    global _lines
+    _lines = lines
+
+
+def _evaluate_lines(lines):
+    return ''.join(code_line.evaluate() for code_line in lines)
+
+
+def _evaluate_range(bounds):
+    start, end = bounds
+    return _evaluate_lines(_lines[start:end])
+
+
+def evaluate_code_lines(lines, workers=None, chunk_size=CHUNK_SIZE):
+    """Devuelve el SVG de todas las líneas, evaluándolas en workers procesos
+    (por defecto, uno por CPU). Si las líneas entran en un solo bloque o hay
+    un solo worker, se evalúan en este proceso."""
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if workers <= 1 or len(lines) <= chunk_size:
+        return _evaluate_lines(lines)
+
+    bounds = [(start, min(start + chunk_size, len(lines))) for start in range(0, len(lines), chunk_size)]
+    if _FORK:
+        pool = multiprocessing.Pool(workers, _start_worker, (lines,))
+        function, tasks = _evaluate_range, bounds
+    else:
+        pool = multiprocessing.Pool(workers)
+        function, tasks = _evaluate_lines, [lines[start:end] for start, end in bounds]
+
+    try:
+        # imap devuelve los bloques en orden, así que el error que se propaga
+        # es el de la primera línea inválida, igual que evaluando en serie.
+        return ''.join(pool.imap(function, tasks))
+    finally:
+        pool.terminate()
+        pool.join()
@@ -1,3 +1,6 @@
+# coding=utf-8
+import copy
+import threading
 from time import sleep
 
 import ply.yacc as yacc
@@ -9,23 +12,77 @@ from xml.dom.minidom import parseString as xmlParse
 
 from ply.lex import lex
 
-from dibu import lexer_rules
+from dibu import instrument, lexer_rules
+from dibu.scanner import Scanner
 from svgwrite import *
 
 
-def parse(str):
-    """Dado un string, me lo convierte a SVG."""
-    lexer = lex(module=lexer_rules)
-    parser = yacc.yacc(module=parser_rules)
-    abstract_syntax_tree = parser.parse(str, lexer)
+# Construir el lexer y el parser es mucho más caro que usarlos, así que se
+# construyen una sola vez. Como los dos guardan estado mientras parsean,
+# cada thread usa su propia instancia.
+_lock = threading.Lock()
+_master_lexer = None
+_master_parser = None
+_local = threading.local()
 
-    return abstract_syntax_tree.evaluate()
+
+def get_lexer(engine='ply'):
+    """Devuelve el lexer de este thread, construyéndolo la primera vez.
+
+    Con engine='fast' devuelve un Scanner nuevo, que produce los mismos
+    tokens sin pasar por PLY."""
+    global _master_lexer
+    if engine == 'fast':
+        return Scanner()
+    lexer = getattr(_local, 'lexer', None)
+    if lexer is None:
+        with _lock:
+            if _master_lexer is None:
+                _master_lexer = lex(module=lexer_rules)
+            lexer = _master_lexer.clone()
+        _local.lexer = lexer
+    return lexer
+
+
+def get_parser():
+    """Devuelve el parser de este thread, construyéndolo la primera vez.
+
+    Las tablas LALR se calculan una sola vez, en memoria (sin escribir
+    parsetab.py ni parser.out), y los parsers de cada thread las comparten."""
+    global _master_parser
+    parser = getattr(_local, 'parser', None)
+    if parser is None:
+        with _lock:
+            if _master_parser is None:
+                _master_parser = yacc.yacc(module=parser_rules, debug=False, write_tables=False)
+            # El estado del parseo se crea en cada parse, así que alcanza
+            # con una copia que comparta las tablas.
+            parser = copy.copy(_master_parser)
+        _local.parser = parser
+    return parser
+
+
+def parse(str, workers=1, engine='ply'):
+    """Dado un string, me lo convierte a SVG. Con workers distinto de 1 las
+    figuras se evalúan en varios procesos, y con engine='fast' se usa el
+    Scanner en lugar del lexer de PLY."""
+    lexer = get_lexer(engine)
+    lexer.lineno = 1
+    record = instrument.start('dibu')
+    if record is None:
+        abstract_syntax_tree = get_parser().parse(str, lexer)
+        return abstract_syntax_tree.evaluate(workers)
+
+    with record:
+        abstract_syntax_tree = get_parser().parse(str, lexer, tokenfunc=record.counting(lexer.token, 'tokens'))
+        record.phase('parse')
+        return abstract_syntax_tree.evaluate(workers, record=record)
 
 
 if __name__ == '__main__':
     # Build the parser
-    lexer = lex(module=lexer_rules)
-    parser = yacc.yacc(module=parser_rules)
+    lexer = get_lexer()
+    parser = get_parser()
     text = 'rectangle upper_left=(0,0), size=(200, 200), fill="yellow" ' \
            'polygon points=[(0,0), (50, 50), (0, 100)], style="stroke: black; stroke-width: 3; fill: none;" ' \
            'polygon points=[(0,0), (50, 50), (100, 0)], style="stroke: black; stroke-width: 3; fill: none;" ' \
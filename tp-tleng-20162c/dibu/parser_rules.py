@@ -2,14 +2,19 @@
 from dibu.exceptions import SyntacticException
 from lexer_rules import tokens
 from expressions import *
+from points import list_literal, append_to_list_literal
 
 start = 'program'
 
 
+# Las listas (program, parameters, list_items) son recursivas a izquierda:
+# cada elemento se reduce apenas se lee y se agrega al final de la lista ya
+# construida, así que la pila del parser no crece con el largo del programa
+# y construir el AST es lineal.
 def p_program_1(subexpressions):
-    """program : code_line program"""
-    program = subexpressions[2]
-    code_line = subexpressions[1]
+    """program : program code_line"""
+    program = subexpressions[1]
+    code_line = subexpressions[2]
     program.add(code_line)
     subexpressions[0] = program
 
@@ -39,23 +44,22 @@ def p_identifier(subexpressions):
 
 
 def p_parameters(subexpressions):
-    """parameters : param_name EQUAL literal parameters_list"""
-    parameter_name = subexpressions[1]
-    literal = subexpressions[3]
-    parameter_list = subexpressions[4]
+    """parameters : parameters COMMA parameter"""
+    parameters = subexpressions[1]
+    parameters.append(subexpressions[3])
+    subexpressions[0] = parameters
 
-    subexpressions[0] = parameter_list + [Parameter(parameter_name, literal)]
 
-
-def p_parameter_list(subexpressions):
-    """parameters_list : COMMA parameters"""
-    parameters_list = subexpressions[2]
-    subexpressions[0] = parameters_list
+def p_parameters_one(subexpressions):
+    """parameters : parameter"""
+    subexpressions[0] = [subexpressions[1]]
 
 
-def p_empty_parameter_list(subexpressions):
-    """parameters_list : """
-    subexpressions[0] = []
+def p_parameter(subexpressions):
+    """parameter : param_name EQUAL literal"""
+    parameter_name = subexpressions[1]
+    literal = subexpressions[3]
+    subexpressions[0] = Parameter(parameter_name, literal)
 
 
 def p_param_name(subexpressions):
@@ -90,23 +94,24 @@ def p_literal(subexpressions):
     subexpressions[0] = subexpressions[1]
 
 def p_list(subexpressions):
-    """list : L_SQUARE_BRACKET list_items R_SQUARE_BRACKET"""
+    """list : L_SQUARE_BRACKET list_items R_SQUARE_BRACKET
+            | L_SQUARE_BRACKET list_items COMMA R_SQUARE_BRACKET"""
     subexpressions[0] = subexpressions[2]
 
 
+def p_list_empty(subexpressions):
+    """list : L_SQUARE_BRACKET R_SQUARE_BRACKET"""
+    subexpressions[0] = []
+
+
 def p_list_items(subexpressions):
-    """list_items : literal COMMA list_items"""
-    subexpressions[0] = [subexpressions[1]] + subexpressions[3]
+    """list_items : list_items COMMA literal"""
+    subexpressions[0] = append_to_list_literal(subexpressions[1], subexpressions[3])
 
 
 def p_list_items_one(subexpressions):
     """list_items : literal"""
-    subexpressions[0] = [subexpressions[1]]
-
-
-def p_list_items_empty(subexpressions):
-    """list_items : """
-    subexpressions[0] = []
+    subexpressions[0] = list_literal(subexpressions[1])
 
 
 def p_error(subexpressions):
@@ -0,0 +1,80 @@
+# coding=utf-8
+"""Listas de puntos guardadas en un array plano de coordenadas.
+
+Los polígonos y polilíneas pueden tener millones de vértices. En vez de una
+lista de tuplas, la lista de puntos se guarda como x0, y0, x1, y1, ... en un
+array de enteros (la gramática sólo acepta coordenadas enteras), y el
+atributo points se formatea de a bloques con una sola operación por bloque.
+"""
+from array import array
+
+FORMAT_CHUNK = 4096
+# %s formatea los enteros bastante más rápido que %d.
+_FULL_TEMPLATE = '%s,%s ' * FORMAT_CHUNK
+
+
+class Points(object):
+    def __init__(self, points=()):
+        self.coordinates = array('l')
+        for point in points:
+            self.append(point)
+
+    def append(self, point):
+        x, y = point
+        self.coordinates.append(x)
+        self.coordinates.append(y)
+
+    def __len__(self):
+        return len(self.coordinates) // 2
+
+    def __iter__(self):
+        coordinates = self.coordinates
+        for i in xrange(0, len(coordinates), 2):
+            yield coordinates[i], coordinates[i + 1]
+
+    def __eq__(self, other):
+        return isinstance(other, Points) and self.coordinates == other.coordinates
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'Points(%r)' % list(self)
+
+    def format(self):
+        """Devuelve 'x0,y0 x1,y1 ... ', como se escribe en el atributo points."""
+        coordinates = self.coordinates
+        step = 2 * FORMAT_CHUNK
+        chunks = []
+        for start in xrange(0, len(coordinates), step):
+            block = coordinates[start:start + step]
+            template = _FULL_TEMPLATE if len(block) == step else '%s,%s ' * (len(block) // 2)
+            chunks.append(template % tuple(block))
+        return ''.join(chunks)
+
+
+def list_literal(item):
+    """Empieza el literal de una lista con su primer elemento."""
+    if item.__class__ is tuple:
+        try:
+            return Points([item])
+        except OverflowError:
+            pass
+    return [item]
+
+
+def append_to_list_literal(items, item):
+    """Agrega un elemento a la lista y la devuelve. Si deja de ser una lista
+    de puntos que entran en el array, se convierte en una lista común."""
+    if items.__class__ is Points:
+        if item.__class__ is tuple:
+            try:
+                items.append(item)
+                return items
+            except OverflowError:
+                # append agrega x antes de fallar en y.
+                if len(items.coordinates) % 2:
+                    items.coordinates.pop()
+        items = list(items)
+    items.append(item)
+    return items
@@ -0,0 +1,94 @@
+# coding=utf-8
+"""Analizador léxico escrito a mano, alternativo al de PLY.
+
+Produce exactamente los mismos tokens que lexer_rules (mismo tipo, valor,
+línea y posición) con una sola expresión regular y una tabla por tipo de
+token, sin pasar por la maquinaria genérica de PLY. Tiene la misma interfaz
+que un lexer de PLY, así que se le puede pasar al parser.
+"""
+import re
+
+from ply.lex import LexToken
+
+from dibu.exceptions import SyntacticException
+from dibu.lexer_rules import reserved
+
+_TOKEN = re.compile(r'''
+    [ \t\n]*
+    (?:
+        (?P<POINT>\([0-9]+,\s?[0-9]+\))
+      | (?P<NUMBER>(?:[0-9]+\.[0-9]+)|(?:[0-9]+\.)|(?:\.[0-9]+)|(?:[1-9][0-9]+|[0-9]))
+      | (?P<WORD>[a-z_][a-z_-]*)
+      | (?P<STRING>"[a-z 0-9,.:=;-]*")
+      | (?P<PUNCTUATION>[\[\]=,])
+    )''', re.VERBOSE)
+
+_PUNCTUATION = {'[': 'L_SQUARE_BRACKET', ']': 'R_SQUARE_BRACKET', '=': 'EQUAL', ',': 'COMMA'}
+_IGNORED = re.compile(r'[ \t\n]*')
+
+
+class Scanner(object):
+    def __init__(self):
+        self.lexdata = ''
+        self.lexpos = 0
+        self.lineno = 1
+        self._tokens = iter(())
+
+    def input(self, string):
+        self.lexdata = string
+        self.lexpos = 0
+        self._tokens = self._scan(string)
+
+    def clone(self):
+        return Scanner()
+
+    def token(self):
+        return next(self._tokens, None)
+
+    def _scan(self, data):
+        match_token = _TOKEN.match
+        end = len(data)
+        position = 0
+        while True:
+            match = match_token(data, position)
+            if match is None:
+                position = _IGNORED.match(data, position).end()
+                self.lexpos = position
+                if position < end:
+                    self._error(position)
+                return
+
+            kind = match.lastgroup
+            value = match.group(kind)
+            token = LexToken()
+            token.lexer = self
+            token.lineno = self.lineno
+            token.lexpos = match.start(kind)
+            position = self.lexpos = match.end()
+
+            if kind == 'WORD':
+                try:
+                    kind = reserved[value]
+                except KeyError:
+                    raise SyntacticException("Palabra desconocida: %s (línea %s posición %s)" %
+                                             (value, token.lineno, token.lexpos))
+            elif kind == 'NUMBER':
+                value = float(value) if '.' in value else int(value)
+            elif kind == 'POINT':
+                value = tuple(map(int, value[1:-1].split(',')))
+            elif kind == 'PUNCTUATION':
+                kind = _PUNCTUATION[value]
+            token.type = kind
+            token.value = value
+            yield token
+
+    def _error(self, position):
+        message = "Token desconocido:"
+        message += "\ntype:error"
+        message += "\nvalue:" + self.lexdata[position:]
+        message += "\nline:" + str(self.lineno)
+        message += "\nposition:" + str(position)
+        raise SyntacticException(message)
+
+    def __iter__(self):
+        return self._tokens
@@ -0,0 +1,50 @@
+# coding=utf-8
+"""Esquema de las figuras de Dibu.
+
+Cada figura declara su tag SVG, sus parámetros obligatorios y los opcionales.
+El esquema se compila una sola vez a conjuntos inmutables, así que validar
+una línea de código es una sola pasada por sus parámetros.
+"""
+from dibu.emitters import EMITTERS
+
+COMMON_PARAMETERS = ('fill', 'stroke', 'stroke-width', 'style')
+
+
+class Shape(object):
+    def __init__(self, identifier, tag, obligatory_parameters, optional_parameters=()):
+        self.identifier = identifier
+        # None para las figuras que no dibujan nada, como size.
+        self.tag = tag
+        # Tupla y no conjunto para reportar los faltantes siempre en el mismo orden.
+        self.obligatory_parameters = tuple(obligatory_parameters)
+        self.valid_parameters = frozenset(obligatory_parameters) | frozenset(optional_parameters)
+        # Los emisores de los parámetros válidos que dibujan algo.
+        self.emitters = dict((parameter_name, EMITTERS[parameter_name])
+                             for parameter_name in self.valid_parameters if parameter_name in EMITTERS)
+
+
+SHAPES = {}
+
+
+def register_shape(identifier, tag, obligatory_parameters, optional_parameters=COMMON_PARAMETERS):
+    """Registra (o reemplaza) una figura y la devuelve.
+
+    El identificador tiene que ser además una palabra reservada del lexer
+    para poder usarlo en un programa."""
+    shape = Shape(identifier, tag, obligatory_parameters, optional_parameters)
+    SHAPES[identifier] = shape
+    return shape
+
+
+def shape_for(identifier):
+    return SHAPES[identifier]
+
+
+register_shape('polygon', 'polygon', ['points'])
+register_shape('rectangle', 'rect', ['upper_left', 'size'])
+register_shape('line', 'line', ['from', 'to'])
+register_shape('circle', 'circle', ['center', 'radius'])
+register_shape('ellipse', 'ellipse', ['center', 'rx', 'ry'])
+register_shape('polyline', 'polyline', ['points'])
+register_shape('text', 'text', ['t', 'at'], ('font-family', 'font-size') + COMMON_PARAMETERS)
+register_shape('size', None, ['height', 'width'])
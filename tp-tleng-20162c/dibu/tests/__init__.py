@@ -1,20 +1,28 @@
+import os
+import shutil
+import tempfile
+import threading
+from StringIO import StringIO
 from unittest import TestCase
 
-from ply import yacc
-from ply.lex import lex
-
-from dibu import lexer_rules
 from dibu import parse
-from dibu import parser_rules
+from dibu.parser import get_lexer, get_parser
 from xml.dom.minidom import parseString as xmlParse
 
+from dibu import instrument, parser_rules
+from dibu.cli import compile_tree
 from dibu.exceptions import SyntacticException, SemanticException
+from dibu.expressions import CodeLine, Parameter
+from dibu.incremental import LineCache
+from dibu.points import FORMAT_CHUNK, Points, append_to_list_literal
+from dibu.scanner import Scanner
+from dibu.shapes import SHAPES, register_shape
 
 
 class TestTLENG(TestCase):
     def setUp(self):
-        self.lexer = lex(module=lexer_rules)
-        self.parser = yacc.yacc(module=parser_rules)
+        self.lexer = get_lexer()
+        self.parser = get_parser()
 
     def test_correct_parsing_of_rectangle(self):
         text = 'rectangle upper_left=(0,0), size=(200, 200), fill="yellow" '
@@ -49,7 +57,7 @@ class TestTLENG(TestCase):
         self.assertEqual(abstract_syntax_tree.lines[0].identifier, 'line')
         self.assertEqual(len(abstract_syntax_tree.lines[0].parameters), 2)
         self.assertTrue('line' in result)
-        self.assertTrue('x1="25" y1="50" x2="0" y2="100"' in result)
+        self.assertTrue('x2="0" y2="100" x1="25" y1="50"' in result)
 
     def test_correct_parsing_of_circle(self):
         text = 'circle center=(100,100), radius=20'
@@ -60,7 +68,7 @@ class TestTLENG(TestCase):
         self.assertEqual(abstract_syntax_tree.lines[0].identifier, 'circle')
         self.assertEqual(len(abstract_syntax_tree.lines[0].parameters), 2)
         self.assertTrue('circle' in result)
-        self.assertTrue('radius="20" cx="100" cy="100"' in result)
+        self.assertTrue('cx="100" cy="100" radius="20"' in result)
 
     def test_correct_parsing_of_polyline(self):
         text = 'polyline points = [(200, 100), (150, 50), (200, 0)]'
@@ -93,7 +101,7 @@ class TestTLENG(TestCase):
         self.assertEqual(abstract_syntax_tree.lines[0].identifier, 'ellipse')
         self.assertEqual(len(abstract_syntax_tree.lines[0].parameters), 3)
         self.assertTrue('ellipse' in result)
-        self.assertTrue('ry="20" rx="20" cx="100" cy="100"' in result)
+        self.assertTrue('cx="100" cy="100" rx="20" ry="20"' in result)
 
     def test_correct_parsing_of_text_without_optional_parameters(self):
         text = 'text t="esto es un texto", at=(10, 20)'
@@ -118,7 +126,7 @@ class TestTLENG(TestCase):
         self.assertTrue('text' in result)
         self.assertTrue('>esto es un texto</text>' in result)
         self.assertTrue('x="10" y="20"' in result)
-        self.assertTrue('style="font-size=12;font-family=bakbatn;"' in result)
+        self.assertTrue('style="font-family=bakbatn;font-size=12;"' in result)
 
     def test_correct_parsing_more_than_one_line(self):
         text = 'line to=(0, 100), from=(25, 50)' \
@@ -170,3 +178,292 @@ class TestTLENG(TestCase):
 
         abstract_syntax_tree = self.parser.parse(text, self.lexer)
         self.assertRaises(SemanticException, abstract_syntax_tree.evaluate)
+
+    def test_lines_are_kept_in_program_order(self):
+        text = 'circle center=(50, 50), radius=50, fill="red"' \
+               'circle center=(50, 50), radius=25, fill="black"'
+        abstract_syntax_tree = self.parser.parse(text, self.lexer)
+        result = abstract_syntax_tree.evaluate()
+
+        self.assertEqual([line.parameters[-1].literal for line in abstract_syntax_tree.lines],
+                         ['"red"', '"black"'])
+        self.assertTrue(result.index('"red"') < result.index('"black"'))
+
+    def test_parameters_are_kept_in_source_order(self):
+        text = 'circle fill="red", center=(50, 50), radius=50'
+        abstract_syntax_tree = self.parser.parse(text, self.lexer)
+
+        self.assertEqual([parameter.parameter_name for parameter in abstract_syntax_tree.lines[0].parameters],
+                         ['fill', 'center', 'radius'])
+        self.assertTrue('fill="red" cx="50" cy="50" radius="50"' in abstract_syntax_tree.evaluate())
+
+        abstract_syntax_tree = self.parser.parse('circle center=(50, 50), radius=50, rx=1, ry=1', self.lexer)
+        with self.assertRaises(SemanticException) as context:
+            abstract_syntax_tree.evaluate()
+        self.assertTrue('rx no es' in str(context.exception))
+
+    def _max_stack_depth(self, text):
+        depths = []
+
+        def token():
+            depths.append(len(self.parser.statestack))
+            return self.lexer.token()
+
+        self.parser.parse(text, self.lexer, tokenfunc=token)
+        return max(depths)
+
+    def test_parser_stack_does_not_grow_with_program_length(self):
+        line = 'circle center=(100,100), radius=20, fill="red" '
+        self.assertEqual(self._max_stack_depth(line * 10), self._max_stack_depth(line * 1000))
+
+    def test_parser_stack_does_not_grow_with_list_length(self):
+        few_points = 'polygon points=[%s]' % ', '.join(['(0, 1)'] * 10)
+        many_points = 'polygon points=[%s]' % ', '.join(['(0, 1)'] * 1000)
+        self.assertEqual(self._max_stack_depth(few_points), self._max_stack_depth(many_points))
+
+    def test_list_literal_grows_in_place(self):
+        # Cada elemento se agrega a la lista que ya estaba, sin copiar los
+        # anteriores, por lo que armarla es lineal en la cantidad de elementos.
+        appended_in_place = []
+
+        def append(items, item):
+            result = append_to_list_literal(items, item)
+            appended_in_place.append(result is items)
+            return result
+
+        text = 'polygon points=[%s]' % ', '.join(['(0, 1)'] * 50000)
+        parser_rules.append_to_list_literal = append
+        try:
+            abstract_syntax_tree = self.parser.parse(text, self.lexer)
+        finally:
+            parser_rules.append_to_list_literal = append_to_list_literal
+
+        self.assertEqual(len(abstract_syntax_tree.lines[0].parameters[0].literal), 50000)
+        self.assertEqual(len(appended_in_place), 49999)
+        self.assertTrue(all(appended_in_place))
+
+    def test_streamed_svg_matches_evaluate(self):
+        text = 'size height=100, width=100' \
+               'circle center=(50, 50), radius=50, fill="red"' \
+               'polygon points=[(0,0), (50, 50), (0, 100)]'
+        abstract_syntax_tree = self.parser.parse(text, self.lexer)
+        chunks = list(abstract_syntax_tree.iter_svg())
+        fileobj = StringIO()
+        abstract_syntax_tree.write_to(fileobj)
+
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(''.join(chunks), abstract_syntax_tree.evaluate())
+        self.assertEqual(fileobj.getvalue(), abstract_syntax_tree.evaluate())
+
+    def test_registered_shape_is_validated_and_evaluated(self):
+        register_shape('marker', 'use', ['at'])
+        try:
+            result = CodeLine('marker', [Parameter('at', (10, 20)), Parameter('fill', '"red"')]).evaluate()
+            self.assertEqual(result, '<use x="10" y="20" fill="red" />')
+            self.assertRaises(SemanticException, CodeLine('marker', [Parameter('fill', '"red"')]).evaluate)
+            self.assertRaises(SemanticException, CodeLine('marker', [Parameter('at', (10, 20)),
+                                                                     Parameter('radius', 2)]).evaluate)
+        finally:
+            del SHAPES['marker']
+
+    def test_program_keeps_its_size_line(self):
+        text = 'circle center=(50, 50), radius=50' \
+               'size height=100, width=300' \
+               'circle center=(50, 50), radius=25'
+        abstract_syntax_tree = self.parser.parse(text, self.lexer)
+
+        self.assertEqual(abstract_syntax_tree.size_line.identifier, 'size')
+        self.assertTrue('height="100" version="1.1" width="300"' in abstract_syntax_tree.header())
+
+        size_line = abstract_syntax_tree.size_line
+        validations = []
+        size_line.validate_correct_code_line = lambda: validations.append(size_line)
+        abstract_syntax_tree.evaluate()
+        self.assertEqual(len(validations), 1)
+
+    def test_duplicated_size_raises_exception_while_parsing(self):
+        text = 'size height=100, width=100' \
+               'circle center=(50, 50), radius=50' \
+               'size height=200, width=200'
+
+        self.assertRaises(SemanticException, self.parser.parse, text, self.lexer)
+
+    def test_parallel_evaluation_matches_serial(self):
+        text = 'size height=100, width=300' + \
+               'circle center=(50, 50), radius=25, fill="red"' * 5 + \
+               'polygon points=[(0,0), (50, 50), (0, 100)]' * 4
+        abstract_syntax_tree = self.parser.parse(text, self.lexer)
+
+        self.assertEqual(abstract_syntax_tree.evaluate(workers=2, chunk_size=2),
+                         abstract_syntax_tree.evaluate())
+
+    def test_parallel_evaluation_from_several_threads(self):
+        programs = [self.parser.parse('circle center=(50, 50), radius=%d' % radius * 6, self.lexer)
+                    for radius in range(1, 5)]
+        results = {}
+
+        def evaluate(i):
+            results[i] = programs[i].evaluate(workers=2, chunk_size=2)
+
+        threads = [threading.Thread(target=evaluate, args=(i,)) for i in range(len(programs))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([results[i] for i in range(len(programs))],
+                         [program.evaluate() for program in programs])
+
+    def test_threads_share_the_parser_tables(self):
+        parsers = {}
+
+        def parse_in_thread(i):
+            parsers[i] = get_parser()
+            parsers[i].parse('circle center=(50, 50), radius=%d' % (i + 1), get_lexer())
+
+        threads = [threading.Thread(target=parse_in_thread, args=(i,)) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIsNot(parsers[0], parsers[1])
+        self.assertIsNot(parsers[0], self.parser)
+        self.assertIs(parsers[0].action, parsers[1].action)
+        self.assertIs(parsers[0].action, self.parser.action)
+
+    def test_parallel_evaluation_raises_first_error(self):
+        text = 'circle center=(50, 50), radius=25' * 5 + \
+               'circle center=(50, 50)' + \
+               'circle center=(50, 50), radius=25, rx=2'
+        abstract_syntax_tree = self.parser.parse(text, self.lexer)
+
+        with self.assertRaises(SemanticException) as context:
+            abstract_syntax_tree.evaluate(workers=2, chunk_size=2)
+        self.assertTrue('radius' in str(context.exception))
+
+    def test_points_are_stored_in_a_flat_array(self):
+        points = [(i, 2 * i) for i in range(FORMAT_CHUNK + 3)]
+        text = 'polyline points=[%s]' % ', '.join('(%d,%d)' % point for point in points)
+        abstract_syntax_tree = self.parser.parse(text, self.lexer)
+        literal = abstract_syntax_tree.lines[0].parameters[0].literal
+
+        self.assertTrue(isinstance(literal, Points))
+        self.assertEqual(list(literal), points)
+        self.assertTrue('points="%s"' % ''.join('%d,%d ' % point for point in points)
+                        in abstract_syntax_tree.evaluate())
+
+    def _tokens(self, lexer, text):
+        lexer.input(text)
+        return [(token.type, token.value, token.lineno, token.lexpos) for token in lexer]
+
+    def test_keywords_are_whole_words(self):
+        tokens = self._tokens(self.lexer, 'text t="a", at=(1, 2) line to=(0, 1), from=(2, 3)')
+        self.assertEqual([token[0] for token in tokens],
+                         ['TEXT', 'T', 'EQUAL', 'STRING', 'COMMA', 'AT', 'EQUAL', 'POINT',
+                          'LINE', 'TO', 'EQUAL', 'POINT', 'COMMA', 'FROM', 'EQUAL', 'POINT'])
+        self.assertRaises(SyntacticException, self._tokens, self.lexer, 'line toy=(0, 1)')
+
+    def test_scanner_produces_the_same_tokens(self):
+        text = 'size height=200, width=200\n' \
+               'rectangle upper_left=(0,0), size=(50, 50), fill="red", stroke-width="3"\n' \
+               '\tpolygon points=[(0,0), (50, 50),], style="stroke: black; fill: none;"' \
+               'ellipse center=(100,100), rx=2.5, ry=.5, font-size="12" text t="a", at=(1, 2)'
+        self.assertEqual(self._tokens(Scanner(), text), self._tokens(self.lexer, text))
+
+        for invalid in ['line to=(0, 100), invalid_token="test"', 'circle center=(1,  1)', 'size height=1 @']:
+            with self.assertRaises(SyntacticException) as expected:
+                self._tokens(self.lexer, invalid)
+            with self.assertRaises(SyntacticException) as context:
+                self._tokens(Scanner(), invalid)
+            self.assertEqual(str(context.exception), str(expected.exception))
+
+    def test_parse_with_scanner(self):
+        text = 'size height=100, width=100 circle center=(50, 50), radius=50, fill="red"'
+        self.assertEqual(parse(text, engine='fast'), parse(text))
+
+    def test_line_cache_only_evaluates_changed_lines(self):
+        cache = LineCache(maxsize=4)
+        lines = ['size height=100, width=100',
+                 'rectangle size=(10, 10), upper_left=(0,0), fill="red"',
+                 'circle center=(50, 50), radius=1',
+                 'polygon points=[(0,0), (50, 50), (0, 100)]']
+        text = ' '.join(lines)
+        self.assertEqual(cache.render(text), parse(text))
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (0, 4, 0))
+
+        lines[2] = 'circle center=(50, 50), radius=1.0'
+        text = ' '.join(lines)
+        self.assertEqual(cache.render(text), parse(text))
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (3, 5, 1))
+
+    def test_line_cache_raises_the_same_errors(self):
+        cache = LineCache()
+        for text in ['circle center=(50, 50)', 'circle = @', 'size height=1, width=1 size height=2, width=2']:
+            with self.assertRaises(Exception) as expected:
+                parse(text)
+            with self.assertRaises(expected.exception.__class__) as context:
+                cache.render(text)
+            self.assertEqual(str(context.exception), str(expected.exception))
+
+    def test_compile_tree_skips_unchanged_sources(self):
+        source_dir = tempfile.mkdtemp()
+        output_dir = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(source_dir, 'sub'))
+            with open(os.path.join(source_dir, 'a.dibu'), 'w') as f:
+                f.write('circle center=(50, 50), radius=25')
+            with open(os.path.join(source_dir, 'sub', 'b.dibu'), 'w') as f:
+                f.write('rectangle upper_left=(0,0), size=(10, 10)')
+
+            out = StringIO()
+            self.assertEqual(compile_tree(source_dir, output_dir, jobs=1, out=out), 0)
+            self.assertTrue(out.getvalue().startswith('2 compilados, 0 sin cambios, 0 con errores'))
+            with open(os.path.join(output_dir, 'sub', 'b.svg')) as f:
+                self.assertEqual(f.read(), parse('rectangle upper_left=(0,0), size=(10, 10)'))
+
+            with open(os.path.join(source_dir, 'sub', 'b.dibu'), 'w') as f:
+                f.write('circle center=(50, 50)')
+            out = StringIO()
+            err = StringIO()
+            self.assertEqual(compile_tree(source_dir, output_dir, jobs=1, out=out, err=err), 1)
+            self.assertTrue(out.getvalue().startswith('0 compilados, 1 sin cambios, 1 con errores, 1 borrados'))
+            self.assertTrue('SemanticException' in err.getvalue())
+            self.assertFalse(os.path.exists(os.path.join(output_dir, 'sub', 'b.svg')))
+
+            # Una fuente que no se puede leer no frena a las otras.
+            os.remove(os.path.join(source_dir, 'a.dibu'))
+            os.symlink(os.path.join(source_dir, 'missing'), os.path.join(source_dir, 'c.dibu'))
+            with open(os.path.join(source_dir, 'd.dibu'), 'w') as f:
+                f.write('circle center=(50, 50), radius=25')
+            out = StringIO()
+            err = StringIO()
+            self.assertEqual(compile_tree(source_dir, output_dir, jobs=1, out=out, err=err), 2)
+            self.assertTrue(out.getvalue().startswith('1 compilados, 0 sin cambios, 2 con errores, 1 borrados'))
+            self.assertTrue('OSError' in err.getvalue())
+            self.assertFalse(os.path.exists(os.path.join(output_dir, 'a.svg')))
+            self.assertTrue(os.path.exists(os.path.join(output_dir, 'd.svg')))
+        finally:
+            shutil.rmtree(source_dir)
+            shutil.rmtree(output_dir)
+
+    def test_instrument_hook_gets_a_record_per_parse(self):
+        records = []
+        instrument.add_hook(records.append)
+        try:
+            text = 'size height=100, width=100 circle center=(50, 50), radius=25'
+            for engine in ['ply', 'fast']:
+                svg = parse(text, engine=engine)
+            with self.assertRaises(SemanticException):
+                parse('circle center=(50, 50)')
+            program = get_parser().parse(text, get_lexer())
+            program.evaluate()
+        finally:
+            instrument.remove_hook(records.append)
+        parse(text)
+
+        self.assertEqual(len(records), 4)
+        for record in records[:2]:
+            self.assertEqual([name for name, _ in record.phases], ['parse', 'evaluate'])
+            self.assertEqual(record.counts, {'tokens': 16, 'lines': 2, 'parameters': 4, 'bytes': len(svg)})
+        self.assertEqual(records[2].counts['errors'], 1)
+        self.assertEqual([name for name, _ in records[3].phases], ['evaluate'])
+        self.assertEqual(records[3].counts, {'lines': 2, 'parameters': 4, 'bytes': len(svg)})
@@ -6,5 +6,8 @@ setup(
     version="0.0.1",
     author="Teoría de Lenguajes",
     packages=["dibu"],
-    test_suite="tests"
+    test_suite="tests",
+    entry_points={
+        "console_scripts": ["dibu = dibu.cli:main"],
+    }
 )
@@ -0,0 +1,67 @@
+"""Compare the recursive layout/render passes against layout.py and the
+array-backed tree in compact.py.
+
+    python bench_layout.py [repeat]
+"""
+import sys
+import time
+from StringIO import StringIO
+
+from parser import parse
+import layout
+import compact
+
+
+def recursive(tree):
+    tree.propagate_scale(1)
+    tree.synthesize_sizes()
+    tree.propagate_position(0, 0)
+    tree.render(StringIO())
+
+
+def iterative(tree):
+    layout.layout(tree, 1, 0, 0)
+    layout.render(tree, StringIO())
+
+
+def arrays(tree):
+    tree.layout(1, 0, 0)
+    tree.render(StringIO())
+
+
+def cases():
+    yield 'tests.txt', [line.strip() for line in open('tests.txt') if line.strip()]
+    for n in (100, 400, 5000):
+        yield 'concat x%d' % n, ['a' * n]
+        yield 'division x%d' % n, ['/'.join('a' * n)]
+        yield 'parentheses x%d' % n, ['(' * n + 'a' + ')' * n]
+        yield 'superscript x%d' % n, ['{a^' * n + 'a' + '}' * n]
+
+
+def timed(f, trees, repeat):
+    start = time.time()
+    try:
+        for _ in range(repeat):
+            for tree in trees:
+                f(tree)
+    except RuntimeError:
+        return None
+    return (time.time() - start) / repeat
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print '%-20s %15s %15s %15s' % ('case', 'recursive (ms)', 'iterative (ms)', 'arrays (ms)')
+    for name, formulas in cases():
+        trees = [parse(formula) for formula in formulas]
+        compact_trees = [compact.parse(formula) for formula in formulas]
+        rec = timed(recursive, trees, repeat)
+        it = timed(iterative, trees, repeat)
+        arr = timed(arrays, compact_trees, repeat)
+        print '%-20s %15s %15.3f %15.3f' % (
+            name, 'recursion limit' if rec is None else '%.3f' % (rec * 1000),
+            it * 1000, arr * 1000)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""Per-phase benchmark over generated formulas.
+
+    python bench_phases.py [options] [--output run.json]
+    python bench_phases.py --compare old.json new.json
+
+Times lexing, parsing, each of the three layout passes (propagate_scale,
+synthesize_sizes, propagate_position) and render separately for every
+formula, and reports throughput and latency percentiles per phase plus the
+peak RSS of the process. Parsing includes its own lexing, so the lex phase
+is also reported on its own. Results can be saved as JSON and two saved
+runs compared.
+"""
+import argparse
+import json
+import platform
+import resource
+import sys
+import time
+
+import ply
+
+from emitter import bytearray_emitter
+from formulagen import FormulaGenerator
+from lexer import get_lexer
+from parser import parse
+
+PHASES = ('lex', 'parse', 'propagate_scale', 'synthesize_sizes',
+          'propagate_position', 'render')
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def lex_all(formula):
+    lexer = get_lexer()
+    lexer.input(formula)
+    for _ in lexer:
+        pass
+
+
+def run(formulas, engine):
+    timings = dict((phase, []) for phase in PHASES)
+    clock = time.time
+    for formula in formulas:
+        t0 = clock()
+        lex_all(formula)
+        t1 = clock()
+        tree = parse(formula, engine=engine)
+        t2 = clock()
+        tree.propagate_scale(1)
+        t3 = clock()
+        tree.synthesize_sizes()
+        t4 = clock()
+        tree.propagate_position(0, 0)
+        t5 = clock()
+        with bytearray_emitter(bytearray()) as out:
+            tree.render(out)
+        t6 = clock()
+        for phase, start, end in zip(PHASES, (t0, t1, t2, t3, t4, t5), (t1, t2, t3, t4, t5, t6)):
+            timings[phase].append(end - start)
+    return timings
+
+
+def summarize(timings, formulas):
+    chars = sum(len(formula) for formula in formulas)
+    phases = {}
+    for phase in PHASES:
+        values = sorted(timings[phase])
+        total = sum(values)
+        phases[phase] = {
+            'total_s': total,
+            'formulas_per_s': len(values) / total if total else None,
+            'chars_per_s': chars / total if total else None,
+            'p50_us': percentile(values, 50) * 1e6,
+            'p90_us': percentile(values, 90) * 1e6,
+            'p99_us': percentile(values, 99) * 1e6,
+            'max_us': values[-1] * 1e6 if values else 0.0,
+        }
+    return phases
+
+
+def report(result):
+    print '%d formulas, %d chars, peak RSS %d KB' % (
+        result['formulas'], result['chars'], result['peak_rss_kb'])
+    print '%-20s %12s %10s %10s %10s %10s' % (
+        'phase', 'formulas/s', 'p50 (us)', 'p90 (us)', 'p99 (us)', 'max (us)')
+    for phase in PHASES:
+        stats = result['phases'][phase]
+        print '%-20s %12.0f %10.1f %10.1f %10.1f %10.1f' % (
+            phase, stats['formulas_per_s'] or 0, stats['p50_us'], stats['p90_us'],
+            stats['p99_us'], stats['max_us'])
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print '%-20s %14s %14s %8s' % ('phase', 'old formulas/s', 'new formulas/s', 'ratio')
+    for phase in PHASES:
+        before = old['phases'][phase]['formulas_per_s'] or 0
+        after = new['phases'][phase]['formulas_per_s'] or 0
+        print '%-20s %14.0f %14.0f %7.2fx' % (
+            phase, before, after, after / before if before else float('nan'))
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Benchmark every phase of the formula pipeline')
+    argparser.add_argument('--count', type=int, default=2000, help='number of formulas')
+    argparser.add_argument('--depth', type=int, default=4)
+    argparser.add_argument('--width', type=int, default=4)
+    argparser.add_argument('--fraction', type=float, default=0.2)
+    argparser.add_argument('--script', type=float, default=0.2)
+    argparser.add_argument('--group', type=float, default=0.2)
+    argparser.add_argument('--seed', type=int, default=0)
+    argparser.add_argument('--parser', choices=('ply', 'fast'), default='ply')
+    argparser.add_argument('--output', metavar='FILE', help='save the results as JSON')
+    argparser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                           help='compare two saved runs instead of running')
+    args = argparser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    generator = FormulaGenerator(depth=args.depth, width=args.width, fraction=args.fraction,
+                                 script=args.script, group=args.group, seed=args.seed)
+    formulas = [generator.formula() for _ in range(args.count)]
+
+    # Warm up the lazily built lexer and parser outside the timings.
+    parse(formulas[0], engine=args.parser)
+
+    timings = run(formulas, args.parser)
+    result = {
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'ply': ply.__version__,
+        'parser': args.parser,
+        'generator': {'count': args.count, 'depth': args.depth, 'width': args.width,
+                      'fraction': args.fraction, 'script': args.script,
+                      'group': args.group, 'seed': args.seed},
+        'formulas': len(formulas),
+        'chars': sum(len(formula) for formula in formulas),
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'phases': summarize(timings, formulas),
+    }
+    report(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
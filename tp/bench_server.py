@@ -0,0 +1,118 @@
+"""Load generator for the render server.
+
+    python bench_server.py [--clients N] [--duration S] [--unix PATH | --port PORT]
+                           [--kind tp|dibu] [server options]
+
+Without --unix or --port it starts a server in this process (with the
+given --workers, --batch-size, ...) on a free port. Each client thread
+sends formulas from FormulaGenerator, one at a time over a keep-alive
+connection, for the given duration. Reports requests/s, the latency
+percentiles of the successful requests and how many were turned away.
+"""
+import argparse
+import httplib
+import threading
+import time
+
+from bench_phases import percentile
+from formulagen import FormulaGenerator
+import server
+
+DIBU_PROGRAM = ('size height=200, width=200 '
+                'rectangle upper_left=(0,0), size=(50, 50), fill="red" '
+                'circle center=(100,100), radius=20, stroke="black" '
+                'polygon points=[(0,0), (50, 50), (0, 100)], style="stroke: black; fill: none;"')
+
+
+def client(connect, kind, sources, deadline, results):
+    latencies = []
+    statuses = {}
+    connection = connect()
+    i = 0
+    while time.time() < deadline:
+        source = sources[i % len(sources)]
+        i += 1
+        start = time.time()
+        try:
+            connection.request('POST', '/' + kind, source)
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+        except (httplib.HTTPException, IOError):
+            connection.close()
+            connection = connect()
+            status = 'error'
+        if status == 200:
+            latencies.append(time.time() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+    connection.close()
+    results.append((latencies, statuses))
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Load test the render server')
+    argparser.add_argument('--clients', type=int, default=16)
+    argparser.add_argument('--duration', type=float, default=5, help='seconds')
+    argparser.add_argument('--kind', choices=('tp', 'dibu'), default='tp')
+    argparser.add_argument('--unix', metavar='PATH', help='use a running server on this socket')
+    argparser.add_argument('--port', type=int, help='use a running server on this port')
+    argparser.add_argument('--workers', type=int, default=None)
+    argparser.add_argument('--batch-size', type=int, default=32)
+    argparser.add_argument('--batch-window', type=float, default=2, help='milliseconds')
+    argparser.add_argument('--queue-size', type=int, default=256)
+    argparser.add_argument('--seed', type=int, default=0)
+    args = argparser.parse_args()
+
+    render_queue = http_server = None
+    port = args.port
+    if args.unix is None and port is None:
+        render_queue = server.RenderQueue(args.workers, args.batch_size, args.batch_window / 1000.0,
+                                          args.queue_size)
+        http_server = server.make_server(render_queue)
+        port = http_server.server_address[1]
+        thread = threading.Thread(target=http_server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    if args.unix is not None:
+        connect = lambda: server.UnixHTTPConnection(args.unix)
+    else:
+        connect = lambda: httplib.HTTPConnection('127.0.0.1', port, timeout=60)
+
+    if args.kind == 'tp':
+        generator = FormulaGenerator(seed=args.seed)
+        sources = [generator.formula() for _ in range(1000)]
+    else:
+        sources = [DIBU_PROGRAM]
+
+    results = []
+    deadline = time.time() + args.duration
+    start = time.time()
+    clients = [threading.Thread(target=client, args=(connect, args.kind, sources, deadline, results))
+               for _ in range(args.clients)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.time() - start
+
+    latencies = sorted(latency for client_latencies, _ in results for latency in client_latencies)
+    statuses = {}
+    for _, client_statuses in results:
+        for status, count in client_statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+
+    print '%d clients, %.1f s' % (args.clients, elapsed)
+    print 'requests/s  %.0f ok, %.0f total' % (len(latencies) / elapsed, sum(statuses.values()) / elapsed)
+    print 'latency     p50 %.1f ms, p99 %.1f ms' % (percentile(latencies, 50) * 1000,
+                                                     percentile(latencies, 99) * 1000)
+    print 'responses   %s' % ', '.join('%s: %d' % item for item in sorted(statuses.items()))
+    if render_queue is not None:
+        print 'server      %s' % render_queue.stats()
+        http_server.shutdown()
+        http_server.server_close()
+        render_queue.close()
+
+
+if __name__ == '__main__':
+    main()
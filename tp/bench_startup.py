@@ -0,0 +1,66 @@
+"""Measure import-to-first-render latency of a fresh process.
+
+    python bench_startup.py [runs]
+
+Each run starts a new interpreter in an empty temporary directory, imports
+gen and renders one formula. It is done once against this directory, with
+the shipped tables, and once against a copy without them, where PLY has to
+build the tables from the grammar on the first parse.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+CHILD = '''
+import time
+start = time.time()
+import gen
+imported = time.time()
+gen.render('{({{A^B}{C^D}}/{{{E^F_G}+}H})-}I', gen.bytearray_emitter(bytearray()))
+rendered = time.time()
+print('%f %f' % (imported - start, rendered - imported))
+'''
+
+
+def run(source_dir, runs):
+    imports = []
+    renders = []
+    cwd = tempfile.mkdtemp()
+    try:
+        env = dict(os.environ, PYTHONPATH=source_dir, PYTHONDONTWRITEBYTECODE='1')
+        for _ in range(runs):
+            out = subprocess.check_output([sys.executable, '-c', CHILD], cwd=cwd, env=env)
+            imported, rendered = map(float, out.split())
+            imports.append(imported)
+            renders.append(rendered)
+        if os.listdir(cwd):
+            print 'warning: files written to the working directory: %s' % os.listdir(cwd)
+    finally:
+        shutil.rmtree(cwd)
+    return sum(imports) / runs, sum(renders) / runs
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    without_tables = tempfile.mkdtemp()
+    try:
+        for name in os.listdir(here):
+            if name.endswith('.py') and not name.startswith('formula_'):
+                shutil.copy(os.path.join(here, name), without_tables)
+
+        print '%-16s %12s %18s' % ('', 'import (ms)', 'first render (ms)')
+        for label, source_dir in (('shipped tables', here),
+                                  ('no tables', without_tables)):
+            imported, rendered = run(source_dir, runs)
+            print '%-16s %12.2f %18.2f' % (label, imported * 1000, rendered * 1000)
+    finally:
+        shutil.rmtree(without_tables)
+
+
+if __name__ == '__main__':
+    main()
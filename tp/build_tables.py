@@ -0,0 +1,25 @@
+"""Regenerate the lexer and parser tables shipped next to the sources,
+formula_lextab.py and formula_parsetab.py.
+
+Run it after changing the tokens in lexer.py or the grammar in parser.py:
+
+    python build_tables.py
+"""
+import os
+
+import ply.lex as lex
+import ply.yacc as yacc
+
+import lexer
+import parser
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+for name in ('formula_lextab', 'formula_parsetab'):
+    for ext in ('.py', '.pyc'):
+        path = os.path.join(here, name + ext)
+        if os.path.exists(path):
+            os.remove(path)
+
+lex.lex(module=lexer, optimize=1, lextab='formula_lextab', outputdir=here)
+yacc.yacc(module=parser, tabmodule='formula_parsetab', outputdir=here, debug=False)
@@ -0,0 +1,98 @@
+"""Check that incremental re-layout (incremental.py) matches laying out
+the edited text from scratch.
+
+    python check_incremental.py [random edits]
+
+Applies random edits (valid or not) to LiveFormulas started from the
+formulas in tests.txt and from generated ones, with the default key cache
+and with one small enough to be evicted all the time. After every edit the
+formula must have the size of a fresh parse of the new text and its
+fragments must draw exactly what the fresh tree draws, and an edit that
+doesn't parse must leave the formula untouched.
+
+The trees themselves aren't compared: the live one nests binary
+concatenations where the parser makes n-ary ones, which places everything
+in the same spot. Reused positions may be floats where a fresh layout has
+ints (0.0 and 0), so numbers in the SVG are compared by value.
+"""
+import random
+import re
+import sys
+
+from formulagen import FormulaGenerator
+from incremental import LiveFormula
+from parser import parse, ParseError, Operation
+import layout
+
+FRAGMENT = re.compile(r'<g id="f\d+">(.*?)</g>\n', re.DOTALL)
+NUMBER = re.compile(r'-?\d+(?:\.\d*)?(?:e-?\d+)?')
+
+
+def normalized(svg):
+    return NUMBER.sub(lambda match: repr(float(match.group())), svg)
+
+
+def fresh_fragments(root):
+    fragments = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        stack.extend(node.subtrees())
+        svg = ''.join(piece for piece in node.render_sequence()
+                      if not isinstance(piece, Operation))
+        if svg:
+            fragments.append(normalized(svg))
+    return sorted(fragments)
+
+
+def random_edit(text):
+    start = random.randint(0, len(text))
+    end = random.randint(start, min(len(text), start + 4))
+    replacement = ''.join(random.choice('ab^_/(){}') for _ in range(random.randint(0, 4)))
+    return start, end, replacement
+
+
+def check(formula, edits, maxsize):
+    # Returns the number of edits that didn't match a fresh layout.
+    live = LiveFormula(formula, maxsize=maxsize)
+    mismatches = 0
+    for _ in range(edits):
+        before = live.text, dict(live.fragments)
+        start, end, replacement = random_edit(live.text)
+        try:
+            live.edit(start, end, replacement)
+        except ParseError:
+            if (live.text, live.fragments) != before:
+                mismatches += 1
+                print 'failed edit changed %r' % before[0]
+            continue
+
+        tree = parse(live.text)
+        layout.layout(tree, 1, 0, 0)
+        drawn = sorted(normalized(fragment) for fragment in
+                       FRAGMENT.findall(''.join(live.fragments.values())))
+        if (live.root.width, live.root.height) != (tree.width, tree.height) or \
+                drawn != fresh_fragments(tree):
+            mismatches += 1
+            print 'mismatch after %r -> %r' % (before[0], live.text)
+    return mismatches
+
+
+def main():
+    edits = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    random.seed(0)
+    formulas = [line.strip() for line in open('tests.txt') if line.strip()]
+    generator = FormulaGenerator(depth=4, fraction=0.3, script=0.3, group=0.3, seed=0)
+    formulas += [generator.formula() for _ in range(len(formulas))]
+
+    mismatches = 0
+    for maxsize in (100000, 8):
+        for formula in formulas:
+            mismatches += check(formula, edits // len(formulas), maxsize)
+    print '%d formulas, %d edits each with 2 key cache sizes, %d mismatches' % (
+        len(formulas), edits // len(formulas), mismatches)
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,44 @@
+"""Check that the memoized layout (memo.py) renders exactly like the object
+tree.
+
+    python check_memo.py [random formulas]
+
+Renders a few formulas that repeat a subtree under one parent at different
+scales, plus random ones, with the plain tree and with one MemoLayout shared
+by all of them (as in a gen.py --memo batch), and compares the SVGs.
+"""
+import sys
+
+from emitter import bytearray_emitter
+from formulagen import FormulaGenerator
+import gen
+import memo
+
+CASES = ['a_a', 'a^a', 'a^b_a', 'x^x_x', '{ab}^{ab}_c', '{a/b}_{a/b}', '(a)^{(a)}',
+         'a_a/a_a', '{x^x}^{x^x}_x']
+
+
+def render(formula, **options):
+    svg = bytearray()
+    with bytearray_emitter(svg) as out:
+        gen.render(formula, out, **options)
+    return str(svg)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1500
+    generator = FormulaGenerator(depth=5, alphabet='abcXYZ12+- ', seed=0)
+    formulas = CASES + [generator.formula() for _ in range(count)]
+
+    memo_layout = memo.MemoLayout()
+    mismatches = 0
+    for formula in formulas:
+        if render(formula, memo_layout=memo_layout) != render(formula):
+            mismatches += 1
+            print 'mismatch: %r' % formula
+    print '%d formulas, %d mismatches' % (len(formulas), mismatches)
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
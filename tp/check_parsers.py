@@ -0,0 +1,88 @@
+"""Check that the hand-written parser (fastparse.py) agrees with the PLY
+parser, and compare their throughput.
+
+    python check_parsers.py [random cases]
+
+Both parsers must make the same builder calls in the same order on every
+formula in tests.txt and on random inputs (valid or not), and fail on the
+same inputs.
+"""
+import random
+import sys
+import time
+
+from formulagen import FormulaGenerator
+from parser import parse, ParseError, TreeBuilder
+
+
+class RecordingBuilder(TreeBuilder):
+    def __init__(self):
+        self.calls = []
+
+    def char(self, c):
+        self.calls.append(('char', c))
+        return TreeBuilder.char(self, c)
+
+    def concatenation(self, left, right):
+        self.calls.append(('concatenation', left.value, right.value))
+        return TreeBuilder.concatenation(self, left, right)
+
+    def division(self, numerator, denominator):
+        self.calls.append(('division', numerator.value, denominator.value))
+        return TreeBuilder.division(self, numerator, denominator)
+
+    def scripts(self, script, superscript, subscript):
+        self.calls.append(('scripts', script.value,
+                           superscript and superscript.value,
+                           subscript and subscript.value))
+        return TreeBuilder.scripts(self, script, superscript, subscript)
+
+    def parentheses(self, child):
+        self.calls.append(('parentheses', child.value))
+        return TreeBuilder.parentheses(self, child)
+
+
+def outcome(formula, engine):
+    builder = RecordingBuilder()
+    try:
+        tree = parse(formula, builder, engine)
+    except ParseError:
+        return None
+    return repr(tree), builder.calls
+
+
+def random_noise():
+    return ''.join(random.choice('ab^_/(){}\t') for _ in range(random.randint(0, 12)))
+
+
+def main():
+    cases = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    random.seed(0)
+    formulas = [line.strip() for line in open('tests.txt') if line.strip()]
+    generator = FormulaGenerator(depth=5, fraction=0.3, script=0.3, group=0.3, seed=0)
+    formulas += [generator.formula() for _ in range(cases // 2)]
+    formulas += [random_noise() for _ in range(cases // 2)]
+
+    mismatches = 0
+    for formula in formulas:
+        if outcome(formula, 'ply') != outcome(formula, 'fast'):
+            mismatches += 1
+            print 'mismatch: %r' % formula
+    valid = [formula for formula in formulas if outcome(formula, 'ply') is not None]
+    print '%d formulas (%d valid), %d mismatches' % (len(formulas), len(valid), mismatches)
+
+    for engine in ('ply', 'fast'):
+        start = time.time()
+        chars = 0
+        for formula in valid:
+            parse(formula, engine=engine)
+            chars += len(formula)
+        elapsed = time.time() - start
+        print '%-5s %10.0f formulas/s %12.0f chars/s' % (
+            engine, len(valid) / elapsed, chars / elapsed)
+
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
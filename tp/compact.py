@@ -0,0 +1,241 @@
+"""Struct-of-arrays representation of a formula tree.
+
+Nodes are integer indices into parallel arrays instead of Operation objects.
+The grammar actions in parser.py build it through CompactTree's builder
+methods, so nodes are numbered bottom-up: every child has a smaller index
+than its parent and the root is the last node. That lets each layout pass
+be a plain loop over the indices, in one direction or the other.
+
+The arithmetic mirrors the Operation classes in parser.py and has to be kept
+in sync with them. Numbers are stored as doubles, so the SVG has the same
+geometry but may print "0.0" where the object tree prints "0".
+"""
+from array import array
+
+import parser
+from parser import TreeBuilder, char_svg, division_line_svg, parenthesis_svg
+
+CHAR = 1
+CONCAT = 2
+DIV = 3
+SCRIPTS = 4
+PAREN = 5
+
+# Index used in place of a missing superscript or subscript.
+EMPTY = -1
+
+
+class CompactTree(object):
+    def __init__(self):
+        self.kind = array('b')
+        self.glyph = array('c')
+        self.first = array('l')
+        self.second = array('l')
+        self.third = array('l')
+        self.scale = array('d')
+        self.width = array('d')
+        self.height = array('d')
+        self.div_line_offset = array('d')
+        self.pos_x = array('d')
+        self.pos_y = array('d')
+        self.root = EMPTY
+
+    def __len__(self):
+        return len(self.kind)
+
+    def _add(self, kind, c='\0', first=EMPTY, second=EMPTY, third=EMPTY):
+        self.kind.append(kind)
+        self.glyph.append(c)
+        self.first.append(first)
+        self.second.append(second)
+        self.third.append(third)
+        for column in (self.scale, self.width, self.height,
+                       self.div_line_offset, self.pos_x, self.pos_y):
+            column.append(0)
+        return len(self.kind) - 1
+
+    # Builder interface used by the grammar actions.
+
+    def char(self, c):
+        return self._add(CHAR, c=c)
+
+    def concatenation(self, left, right):
+        return self._add(CONCAT, first=left, second=right)
+
+    def division(self, numerator, denominator):
+        return self._add(DIV, first=numerator, second=denominator)
+
+    def scripts(self, script, superscript, subscript):
+        if superscript is None:
+            superscript = EMPTY
+        if subscript is None:
+            subscript = EMPTY
+        return self._add(SCRIPTS, first=script, second=superscript, third=subscript)
+
+    def parentheses(self, child):
+        return self._add(PAREN, first=child)
+
+    def layout(self, scale=1, x=0, y=0, record=None):
+        kind, first, second, third = self.kind, self.first, self.second, self.third
+        sc, w, h, d = self.scale, self.width, self.height, self.div_line_offset
+        px, py = self.pos_x, self.pos_y
+        root = self.root
+
+        # Scale, parents before children.
+        sc[root] = scale
+        for i in xrange(root, -1, -1):
+            k = kind[i]
+            s = sc[i]
+            if k == CHAR:
+                continue
+            sc[first[i]] = s
+            if k == SCRIPTS:
+                if second[i] != EMPTY:
+                    sc[second[i]] = s * .7
+                if third[i] != EMPTY:
+                    sc[third[i]] = s * .7
+            elif k != PAREN:
+                sc[second[i]] = s
+        if record is not None:
+            record.phase('scale')
+
+        # Sizes, children before parents.
+        for i in xrange(root + 1):
+            k = kind[i]
+            s = sc[i]
+            if k == CHAR:
+                w[i] = s * .6
+                h[i] = s
+                d[i] = s * .72
+            elif k == CONCAT:
+                a, b = first[i], second[i]
+                w[i] = w[a] + w[b]
+                h[i] = max(h[a], h[b])
+                d[i] = max(d[a], d[b])
+            elif k == DIV:
+                a, b = first[i], second[i]
+                w[i] = max(w[a], w[b])
+                h[i] = h[a] + h[b] + s * .3
+                d[i] = h[a] + s * .3
+            elif k == SCRIPTS:
+                a, sup, sub = first[i], second[i], third[i]
+                sup_w, sup_h = (w[sup], h[sup]) if sup != EMPTY else (0, 0)
+                sub_w, sub_h = (w[sub], h[sub]) if sub != EMPTY else (0, 0)
+                w[i] = w[a] + max(sup_w, sub_w)
+                h[i] = max(h[a] * .5, sup_h) + h[a] * .2 + max(h[a] * .3, sub_h)
+                d[i] = d[a] + max(0, sup_h - h[a] * .5)
+            else:
+                a = first[i]
+                w[i] = s * 1.2 + w[a]
+                h[i] = h[a]
+                d[i] = d[a]
+        if record is not None:
+            record.phase('sizes')
+
+        # Positions, parents before children.
+        px[root] = x
+        py[root] = y
+        for i in xrange(root, -1, -1):
+            k = kind[i]
+            if k == CHAR:
+                continue
+            x, y = px[i], py[i]
+            if k == CONCAT:
+                a, b = first[i], second[i]
+                px[a] = x
+                py[a] = y + d[i] - d[a]
+                px[b] = x + w[a]
+                py[b] = y + d[i] - d[b]
+            elif k == DIV:
+                a, b = first[i], second[i]
+                px[a] = x + (w[i] - w[a]) / 2
+                py[a] = y
+                px[b] = x + (w[i] - w[b]) / 2
+                py[b] = y + d[i]
+            elif k == SCRIPTS:
+                a, sup, sub = first[i], second[i], third[i]
+                sup_h = h[sup] if sup != EMPTY else 0
+                px[a] = x
+                py[a] = y + max(0, sup_h - h[a] * .5)
+                if sup != EMPTY:
+                    px[sup] = x + w[a]
+                    py[sup] = y
+                if sub != EMPTY:
+                    px[sub] = x + w[a]
+                    py[sub] = y + h[a] * .2 + max(h[a] * .5, sup_h)
+            else:
+                px[first[i]] = x + 0.6 * sc[i]
+                py[first[i]] = y
+        if record is not None:
+            record.phase('positions')
+
+    def render(self, fout):
+        kind, first, second, third = self.kind, self.first, self.second, self.third
+        sc, w, h, d = self.scale, self.width, self.height, self.div_line_offset
+        px, py = self.pos_x, self.pos_y
+
+        stack = [self.root]
+        pop, push, write = stack.pop, stack.append, fout.write
+        while stack:
+            i = pop()
+            if i.__class__ is str:
+                write(i)
+                continue
+            k = kind[i]
+            if k == CHAR:
+                write(char_svg(self.glyph[i], px[i], py[i], h[i], sc[i]))
+            elif k == CONCAT:
+                push(second[i])
+                push(first[i])
+            elif k == DIV:
+                push(second[i])
+                push(division_line_svg(px[i], py[i], d[i],
+                                       max(w[first[i]], w[second[i]]), sc[i]))
+                push(first[i])
+            elif k == SCRIPTS:
+                if third[i] != EMPTY:
+                    push(third[i])
+                if second[i] != EMPTY:
+                    push(second[i])
+                push(first[i])
+            else:
+                a = first[i]
+                push(parenthesis_svg(')', px[i] + w[a] + 0.6 * sc[i], py[i], h[i], sc[i]))
+                push(a)
+                write(parenthesis_svg('(', px[i], py[i], h[i], sc[i]))
+
+    def to_operations(self):
+        """Build the equivalent Operation tree, with the laid out sizes and
+        positions copied over, for debugging."""
+        builder = TreeBuilder()
+        nodes = []
+
+        def node(j):
+            return nodes[j] if j != EMPTY else None
+
+        for i in xrange(len(self.kind)):
+            k = self.kind[i]
+            if k == CHAR:
+                op = builder.char(self.glyph[i])
+            elif k == CONCAT:
+                op = builder.concatenation(node(self.first[i]), node(self.second[i]))
+            elif k == DIV:
+                op = builder.division(node(self.first[i]), node(self.second[i]))
+            elif k == SCRIPTS:
+                op = builder.scripts(node(self.first[i]), node(self.second[i]), node(self.third[i]))
+            else:
+                op = builder.parentheses(node(self.first[i]))
+            op.scale = self.scale[i]
+            op.width = self.width[i]
+            op.height = self.height[i]
+            op.div_line_offset = self.div_line_offset[i]
+            op.pos_x = self.pos_x[i]
+            op.pos_y = self.pos_y[i]
+            nodes.append(op)
+        return nodes[self.root]
+
+
+def parse(string, engine='ply', record=None):
+    tree = CompactTree()
+    tree.root = parser.parse(string, tree, engine, record)
+    return tree
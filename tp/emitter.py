@@ -0,0 +1,47 @@
+"""Buffered output for the SVG renderers.
+
+The renderers write lots of small pieces. An Emitter collects them and hands
+them to its sink (any callable taking a string) in chunks of about
+chunk_size bytes, so a whole formula usually reaches the file, buffer or
+socket in a single call.
+"""
+
+CHUNK_SIZE = 1 << 16
+
+
+class Emitter(object):
+    def __init__(self, sink, chunk_size=CHUNK_SIZE):
+        self.sink = sink
+        self.chunk_size = chunk_size
+        self._pending = []
+        self._size = 0
+
+    def write(self, data):
+        self._pending.append(data)
+        self._size += len(data)
+        if self._size >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self.sink(''.join(self._pending))
+            self._pending = []
+            self._size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+
+def file_emitter(f, chunk_size=CHUNK_SIZE):
+    return Emitter(f.write, chunk_size)
+
+
+def bytearray_emitter(buf, chunk_size=CHUNK_SIZE):
+    return Emitter(buf.extend, chunk_size)
+
+
+def socket_emitter(sock, chunk_size=CHUNK_SIZE):
+    return Emitter(sock.sendall, chunk_size)
@@ -0,0 +1,124 @@
+"""Hand-written parser for the formula grammar.
+
+Builds exactly the same trees as the PLY parser in parser.py, making the
+same builder calls in the same order, but tokenizes and parses in a single
+pass over the string with no per-token regex match or per-reduction
+function dispatch. Nested groups are kept on an explicit stack, so nesting
+depth is not limited by the recursion limit.
+
+Select it with parser.parse(string, engine='fast').
+"""
+from parser import ParseError, TreeBuilder
+
+# Where the term being read is, and what may come next:
+#   START     no term yet
+#   BASE      factor, may be followed by ^ or _
+#   SUP       factor ^ factor, may be followed by _
+#   SUB       factor _ factor, may be followed by ^
+#   DONE      factor with both scripts
+#   NEED_SUP  waiting for the factor after ^
+#   NEED_SUB  waiting for the factor after _
+START, BASE, SUP, SUB, DONE, NEED_SUP, NEED_SUB = range(7)
+
+CLOSING = {'(': ')', '{': '}'}
+
+
+class _Group(object):
+    # One open '(' or '{' (or the whole input): a division chain of
+    # concatenations of terms.
+
+    def __init__(self, opener):
+        self.opener = opener
+        self.left = None
+        self.concat = None
+        self.state = START
+        self.base = self.sup = self.sub = None
+
+    def add_factor(self, node, builder):
+        state = self.state
+        if state == NEED_SUP:
+            self.sup = node
+            self.state = DONE if self.sub is not None else SUP
+        elif state == NEED_SUB:
+            self.sub = node
+            self.state = DONE if self.sup is not None else SUB
+        else:
+            self.end_term(builder)
+            self.base = node
+            self.state = BASE
+
+    def end_term(self, builder):
+        if self.state == START:
+            return
+        if self.sup is None and self.sub is None:
+            term = self.base
+        else:
+            term = builder.scripts(self.base, self.sup, self.sub)
+        if self.concat is None:
+            self.concat = term
+        else:
+            self.concat = builder.concatenation(self.concat, term)
+        self.state = START
+        self.base = self.sup = self.sub = None
+
+    def end_concat(self, builder):
+        self.end_term(builder)
+        if self.left is None:
+            expression = self.concat
+        else:
+            expression = builder.division(self.left, self.concat)
+        self.concat = None
+        return expression
+
+
+def _unexpected(c, position):
+    return ParseError("Syntax error in input: unexpected '%s' at position %d" % (c, position))
+
+
+def parse(string, builder=None):
+    if builder is None:
+        builder = TreeBuilder()
+
+    group = _Group(None)
+    groups = []
+    for position, c in enumerate(string):
+        state = group.state
+        if c == '^':
+            if state == BASE or state == SUB:
+                group.state = NEED_SUP
+            else:
+                raise _unexpected(c, position)
+        elif c == '_':
+            if state == BASE or state == SUP:
+                group.state = NEED_SUB
+            else:
+                raise _unexpected(c, position)
+        elif c == '/':
+            if state >= NEED_SUP or (state == START and group.concat is None):
+                raise _unexpected(c, position)
+            group.left = group.end_concat(builder)
+        elif c == '(' or c == '{':
+            if state < NEED_SUP:
+                group.end_term(builder)
+            groups.append(group)
+            group = _Group(c)
+        elif c == ')' or c == '}':
+            if (group.opener is None or CLOSING[group.opener] != c or state >= NEED_SUP or
+                    (state == START and group.concat is None)):
+                raise _unexpected(c, position)
+            expression = group.end_concat(builder)
+            if c == ')':
+                expression = builder.parentheses(expression)
+            group = groups.pop()
+            group.add_factor(expression, builder)
+        elif c == '\t' or c == '\n':
+            # Ignored by the lexer.
+            continue
+        else:
+            if state < NEED_SUP:
+                group.end_term(builder)
+            group.add_factor(builder.char(c), builder)
+
+    if groups or group.state >= NEED_SUP or (group.state == START and group.concat is None):
+        raise ParseError("Syntax error in input: unexpected end of input")
+    return group.end_concat(builder)
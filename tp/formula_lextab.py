@@ -0,0 +1,10 @@
+# formula_lextab.py. This file automatically created by PLY (version 3.9). Don't edit!
+_tabversion   = '3.8'
+_lextokens    = set(('CARET', 'LBRACE', 'RPAREN', 'UNDERSCORE', 'CHAR', 'SLASH', 'LPAREN', 'RBRACE'))
+_lexreflags   = 0
+_lexliterals  = ''
+_lexstateinfo = {'INITIAL': 'inclusive'}
+_lexstatere   = {'INITIAL': [('(?P<t_newline>\\n+)|(?P<t_CHAR>[^\\^_/\\(\\)\\{\\}])|(?P<t_LPAREN>\\()|(?P<t_RBRACE>\\})|(?P<t_LBRACE>\\{)|(?P<t_CARET>\\^)|(?P<t_RPAREN>\\))|(?P<t_UNDERSCORE>_)|(?P<t_SLASH>/)', [None, ('t_newline', 'newline'), (None, 'CHAR'), (None, 'LPAREN'), (None, 'RBRACE'), (None, 'LBRACE'), (None, 'CARET'), (None, 'RPAREN'), (None, 'UNDERSCORE'), (None, 'SLASH')])]}
+_lexstateignore = {'INITIAL': '\t'}
+_lexstateerrorf = {'INITIAL': 't_error'}
+_lexstateeoff = {}
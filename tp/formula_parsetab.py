@@ -0,0 +1,41 @@
+
+# formula_parsetab.py
+# This file is automatically generated. Do not edit.
+_tabversion = '3.8'
+
+_lr_method = 'LALR'
+
+_lr_signature = '23F9FF8B986F8578019BE9521256A8D9'
+    
+_lr_action_items = {'CARET':([3,4,14,16,17,],[-12,9,-11,20,-10,]),'LBRACE':([0,1,2,3,4,5,7,9,10,12,13,14,15,16,17,18,19,20,21,22,],[2,-4,2,-12,-5,2,2,2,2,2,-2,-11,-6,-7,-10,2,2,2,-8,-9,]),'RPAREN':([1,3,4,7,11,13,14,15,16,17,18,21,22,],[-4,-12,-5,-3,17,-2,-11,-6,-7,-10,-1,-8,-9,]),'RBRACE':([1,3,4,7,8,13,14,15,16,17,18,21,22,],[-4,-12,-5,-3,14,-2,-11,-6,-7,-10,-1,-8,-9,]),'UNDERSCORE':([3,4,14,15,17,],[-12,10,-11,19,-10,]),'CHAR':([0,1,2,3,4,5,7,9,10,12,13,14,15,16,17,18,19,20,21,22,],[3,-4,3,-12,-5,3,3,3,3,3,-2,-11,-6,-7,-10,3,3,3,-8,-9,]),'SLASH':([1,3,4,6,7,8,11,13,14,15,16,17,18,21,22,],[-4,-12,-5,12,-3,12,12,-2,-11,-6,-7,-10,-1,-8,-9,]),'LPAREN':([0,1,2,3,4,5,7,9,10,12,13,14,15,16,17,18,19,20,21,22,],[5,-4,5,-12,-5,5,5,5,5,5,-2,-11,-6,-7,-10,5,5,5,-8,-9,]),'$end':([1,3,4,6,7,13,14,15,16,17,18,21,22,],[-4,-12,-5,0,-3,-2,-11,-6,-7,-10,-1,-8,-9,]),}
+
+_lr_action = {}
+for _k, _v in _lr_action_items.items():
+   for _x,_y in zip(_v[0],_v[1]):
+      if not _x in _lr_action:  _lr_action[_x] = {}
+      _lr_action[_x][_k] = _y
+del _lr_action_items
+
+_lr_goto_items = {'term':([0,2,5,7,12,18,],[1,1,1,13,1,13,]),'expression':([0,2,5,],[6,8,11,]),'concat':([0,2,5,12,],[7,7,7,18,]),'factor':([0,2,5,7,9,10,12,18,19,20,],[4,4,4,4,15,16,4,4,21,22,]),}
+
+_lr_goto = {}
+for _k, _v in _lr_goto_items.items():
+   for _x, _y in zip(_v[0], _v[1]):
+       if not _x in _lr_goto: _lr_goto[_x] = {}
+       _lr_goto[_x][_k] = _y
+del _lr_goto_items
+_lr_productions = [
+  ("S' -> expression","S'",1,None,None,None),
+  ('expression -> expression SLASH concat','expression',3,'p_expression_slash','parser.py',367),
+  ('concat -> concat term','concat',2,'p_concat_1','parser.py',372),
+  ('expression -> concat','expression',1,'p_pass_through','parser.py',377),
+  ('concat -> term','concat',1,'p_pass_through','parser.py',378),
+  ('term -> factor','term',1,'p_pass_through','parser.py',379),
+  ('term -> factor CARET factor','term',3,'p_term_1','parser.py',384),
+  ('term -> factor UNDERSCORE factor','term',3,'p_term_2','parser.py',389),
+  ('term -> factor CARET factor UNDERSCORE factor','term',5,'p_term_3','parser.py',394),
+  ('term -> factor UNDERSCORE factor CARET factor','term',5,'p_term_4','parser.py',399),
+  ('factor -> LPAREN expression RPAREN','factor',3,'p_factor_paren','parser.py',404),
+  ('factor -> LBRACE expression RBRACE','factor',3,'p_factor_brace','parser.py',409),
+  ('factor -> CHAR','factor',1,'p_factor','parser.py',414),
+]
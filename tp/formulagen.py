@@ -0,0 +1,57 @@
+"""Random formulas following the grammar in the grammar file.
+
+    expression    : expression / concatenation | concatenation
+    concatenation : concatenation indexed_term | indexed_term
+    indexed_term  : factor [^ factor] [_ factor] (in either order)
+    factor        : ( expression ) | { expression } | CHAR
+"""
+import random
+
+ALPHABET = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789+-=*<> '
+
+
+class FormulaGenerator(object):
+    """
+    depth:    maximum nesting of groups, fractions and scripts
+    width:    maximum number of terms in a concatenation
+    fraction: probability that an expression is a fraction
+    script:   probability that a term has a superscript and/or subscript
+    group:    probability that a factor is a parenthesized or braced group
+    """
+
+    def __init__(self, depth=4, width=4, fraction=0.2, script=0.2, group=0.2,
+                 alphabet=ALPHABET, seed=None):
+        self.depth = depth
+        self.width = width
+        self.fraction = fraction
+        self.script = script
+        self.group = group
+        self.alphabet = alphabet
+        self.random = random.Random(seed)
+
+    def formula(self):
+        return self.expression(self.depth)
+
+    def expression(self, depth):
+        if depth > 0 and self.random.random() < self.fraction:
+            return self.expression(depth - 1) + '/' + self.concatenation(depth - 1)
+        return self.concatenation(depth)
+
+    def concatenation(self, depth):
+        return ''.join(self.indexed_term(depth)
+                       for _ in range(self.random.randint(1, self.width)))
+
+    def indexed_term(self, depth):
+        term = self.factor(depth)
+        if depth > 0 and self.random.random() < self.script:
+            scripts = self.random.choice(('^', '_', '^_', '_^'))
+            for marker in scripts:
+                term += marker + self.factor(depth - 1)
+        return term
+
+    def factor(self, depth):
+        if depth > 0 and self.random.random() < self.group:
+            if self.random.random() < 0.5:
+                return '(' + self.expression(depth - 1) + ')'
+            return '{' + self.expression(depth - 1) + '}'
+        return self.random.choice(self.alphabet)
@@ -1,36 +1,238 @@
-from parser import parser
+from parser import parse
+import layout
+import compact
+import memo
+import svgcache
+import instrument
+from emitter import file_emitter, bytearray_emitter
 import argparse
+import os
+import sys
 
-argparser = argparse.ArgumentParser(description='Typeset lovely formulas')
-argparser.add_argument('string_to_parse')
-argparser.add_argument('output_filename')
 
-args = argparser.parse_args()
+HEADER = ('<?xml version="1.0"?>\n'
+          '<svg xmlns="http://www.w3.org/2000/svg" version="1.1" >\n'
+          '<g transform="scale(40) translate(10,10)" font-family="Courier" >\n'
+          '<line x1="-100" y1="0" x2="100" y2="0" stroke-width="0.02" stroke="black"/>\n'
+          '<line x1="0" y1="-100" x2="0" y2="100" stroke-width="0.02" stroke="black"/>\n')
 
-result = parser.parse(vars(args)['string_to_parse'])
+FOOTER = '</g>\n</svg>\n'
 
+# The background grid: one line per unit from 1 to 100 in each direction,
+# either spelled out or drawn by tiling a one-line pattern.
+GRIDS = {
+    'lines': ''.join('<line x1="%d" y1="-100" x2="%d" y2="100" stroke-width="0.01" stroke="black"/>\n'
+                     '<line x1="-100" y1="%d" x2="100" y2="%d" stroke-width="0.01" stroke="black"/>\n'
+                     % (i, i, i, i) for i in range(1, 101)),
+    'pattern': '<defs>\n'
+               '<pattern id="grid-x" x="0.5" y="-100" width="1" height="200" patternUnits="userSpaceOnUse">'
+               '<line x1="0.5" y1="0" x2="0.5" y2="200" stroke-width="0.01" stroke="black"/></pattern>\n'
+               '<pattern id="grid-y" x="-100" y="0.5" width="200" height="1" patternUnits="userSpaceOnUse">'
+               '<line x1="0" y1="0.5" x2="200" y2="0.5" stroke-width="0.01" stroke="black"/></pattern>\n'
+               '</defs>\n'
+               '<rect x="0.5" y="-100" width="100" height="200" fill="url(#grid-x)"/>\n'
+               '<rect x="-100" y="0.5" width="200" height="100" fill="url(#grid-y)"/>\n',
+    'none': '',
+}
 
-f = open(vars(args)['output_filename'], 'w')
-f.write('<?xml version="1.0"?>\n'
-        '<svg xmlns="http://www.w3.org/2000/svg" version="1.1" >\n'
-        '<g transform="scale(40) translate(10,10)" font-family="Courier" >\n')
 
-if True:
-    f.write(
-        '<line x1="-100" y1="0" x2="100" y2="0" stroke-width="0.02" stroke="black"/>\n')
-    f.write(
-        '<line x1="0" y1="-100" x2="0" y2="100" stroke-width="0.02" stroke="black"/>\n')
+def write_header(f, grid='pattern'):
+    f.write(HEADER + GRIDS[grid])
 
-    for i in range(1, 101):
-        f.write('<line x1="' + str(i) + '" y1="-100" x2="' + str(i) +
-                '" y2="100" stroke-width="0.01" stroke="black"/>\n')
-        f.write('<line x1="-100" y1="' + str(i) + '" x2="100" y2="' +
-                str(i) + '" stroke-width="0.01" stroke="black"/>\n')
 
-result.propagate_scale(1)
-result.synthesize_sizes()
-result.propagate_position(0, 0)
-result.render(f)
+def write_footer(f):
+    f.write(FOOTER)
 
-f.write('</g>\n</svg>\n')
-f.close()
+
+def lay_out(string_to_parse, engine='ply', arrays=False, memo_layout=None, record=None):
+    """Parse and lay out a formula, returning a function that writes its SVG
+    body (everything between the header and the footer) to a file."""
+    if memo_layout is not None:
+        result = memo_layout.parse(string_to_parse, engine, record)
+        if record is not None:
+            record.phase('parse')
+            record.count('nodes', instrument.count_nodes(result))
+            record.skip()
+            sizes = memo_layout.layout(result, 1)
+            record.phase('sizes')
+            return lambda f: memo_layout.render(result, f, 1, 0, 0, sizes)
+        return lambda f: memo_layout.render(result, f, 1, 0, 0)
+
+    if arrays:
+        result = compact.parse(string_to_parse, engine, record)
+        if record is not None:
+            record.phase('parse')
+            record.count('nodes', len(result.kind))
+        result.layout(1, 0, 0, record)
+        return result.render
+
+    result = parse(string_to_parse, engine=engine, record=record)
+    if record is None:
+        layout.layout(result, 1, 0, 0)
+    else:
+        record.phase('parse')
+        record.count('nodes', instrument.count_nodes(result))
+        record.skip()
+        layout.propagate_scale(result, 1)
+        record.phase('scale')
+        layout.synthesize_sizes(result)
+        record.phase('sizes')
+        layout.position(result, 0, 0)
+        record.phase('positions')
+    return lambda f: layout.render(result, f)
+
+
+def render(string_to_parse, f, grid='pattern', engine='ply', arrays=False,
+           memo_layout=None, cache=None):
+    record = instrument.start('tp')
+    if record is None:
+        _render(string_to_parse, f, grid, engine, arrays, memo_layout, cache)
+        return
+    with record:
+        _render(string_to_parse, instrument.CountingWriter(f, record), grid, engine,
+                arrays, memo_layout, cache, record)
+
+
+def _render(string_to_parse, f, grid, engine, arrays, memo_layout, cache, record=None):
+    if cache is None:
+        write_body = lay_out(string_to_parse, engine, arrays, memo_layout, record)
+        last_phase = 'render'
+    else:
+        backend = 'memo' if memo_layout is not None else 'arrays' if arrays else 'tree'
+        body = cache.get(string_to_parse, backend)
+        if body is None:
+            svg = bytearray()
+            with bytearray_emitter(svg) as out:
+                lay_out(string_to_parse, engine, arrays, memo_layout, record)(out)
+            body = str(svg)
+            if record is not None:
+                record.phase('render')
+            cache.put(string_to_parse, body, backend)
+        elif record is not None:
+            record.count('cache_hits')
+        if record is not None:
+            record.phase('cache')
+        write_body = lambda f: f.write(body)
+        last_phase = 'write'
+
+    write_header(f, grid)
+    write_body(f)
+    write_footer(f)
+    if record is not None:
+        record.phase(last_phase)
+
+
+def read_formulas(fin):
+    """Yield (line number, formula) pairs, skipping blank lines."""
+    i = 0
+    for line in fin:
+        i += 1
+        formula = line.strip()
+        if formula:
+            yield i, formula
+
+
+def render_batch(fin, output_dir=None, stream=None, **options):
+    """Render every formula read from fin in this process.
+
+    With output_dir, each formula goes to <output_dir>/<line>.svg. Otherwise
+    they are all written to stream, each one preceded by a
+    "<line> <length>" header giving the size of the SVG that follows.
+
+    Any error rendering a formula (a ParseError or not) is reported on
+    stderr with its line and class and the batch goes on with the next one. Other
+    keyword arguments are passed on to render. Returns the number of
+    formulas that failed.
+    """
+    failures = 0
+    for i, formula in read_formulas(fin):
+        svg = bytearray()
+        try:
+            with bytearray_emitter(svg) as out:
+                render(formula, out, **options)
+        except Exception as e:
+            failures += 1
+            sys.stderr.write('%d: %s: %s: %s\n' % (i, formula, e.__class__.__name__, e))
+            continue
+
+        if output_dir is not None:
+            with open(os.path.join(output_dir, str(i) + '.svg'), 'w') as f:
+                f.write(svg)
+        else:
+            stream.write('%d %d\n' % (i, len(svg)))
+            stream.write(svg)
+    return failures
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Typeset lovely formulas')
+    argparser.add_argument('string_to_parse', nargs='?')
+    argparser.add_argument('output_filename', nargs='?')
+    argparser.add_argument('--batch', metavar='FILE',
+                           help='render every formula in FILE ("-" for stdin)')
+    argparser.add_argument('--output-dir', metavar='DIR',
+                           help='write each formula of the batch to DIR/<line>.svg')
+    argparser.add_argument('--stream', metavar='FILE',
+                           help='write the whole batch to FILE ("-" for stdout)')
+    argparser.add_argument('--grid', choices=sorted(GRIDS), default='pattern',
+                           help='how to draw the background grid (default: pattern)')
+    argparser.add_argument('--parser', choices=('ply', 'fast'), default='ply',
+                           help='parse with PLY or with the hand-written parser')
+    argparser.add_argument('--arrays', action='store_true',
+                           help='lay out with the array-backed tree (compact.py)')
+    argparser.add_argument('--memo', metavar='SIZE', type=int,
+                           help='share the layout of repeated subexpressions, '
+                                'caching up to SIZE subtrees across the batch')
+    argparser.add_argument('--cache', metavar='DIR',
+                           help='reuse rendered formulas stored in DIR, and store new ones')
+    argparser.add_argument('--cache-size', metavar='MB', type=int, default=256,
+                           help='size cap of the --cache directory (default: 256)')
+
+    args = argparser.parse_args()
+
+    options = {'grid': args.grid, 'engine': args.parser, 'arrays': args.arrays}
+    if args.memo is not None:
+        options['memo_layout'] = memo.MemoLayout(args.memo)
+    if args.cache is not None:
+        options['cache'] = svgcache.RenderCache(args.cache, args.cache_size << 20)
+
+    if args.batch is None:
+        if args.string_to_parse is None or args.output_filename is None:
+            argparser.error('string_to_parse and output_filename are required')
+        with open(args.output_filename, 'w') as f, file_emitter(f) as out:
+            render(args.string_to_parse, out, **options)
+        return 0
+
+    if (args.output_dir is None) == (args.stream is None):
+        argparser.error('--batch needs exactly one of --output-dir or --stream')
+
+    fin = sys.stdin if args.batch == '-' else open(args.batch, 'r')
+    try:
+        if args.output_dir is not None:
+            if not os.path.isdir(args.output_dir):
+                os.makedirs(args.output_dir)
+            failures = render_batch(fin, output_dir=args.output_dir, **options)
+        elif args.stream == '-':
+            failures = render_batch(fin, stream=sys.stdout, **options)
+        else:
+            with open(args.stream, 'w') as stream:
+                failures = render_batch(fin, stream=stream, **options)
+    finally:
+        if fin is not sys.stdin:
+            fin.close()
+
+    if args.memo is not None:
+        memo_layout = options['memo_layout']
+        sys.stderr.write('memo: nodes %d hits / %d misses, sizes %d hits / %d misses\n' % (
+            memo_layout.nodes.hits, memo_layout.nodes.misses,
+            memo_layout.sizes.hits, memo_layout.sizes.misses))
+    if args.cache is not None:
+        cache = options['cache']
+        sys.stderr.write('cache: %d hits / %d misses, %d written, %d evicted\n' % (
+            cache.hits, cache.misses, cache.writes, cache.evictions))
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
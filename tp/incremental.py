@@ -0,0 +1,187 @@
+"""Incremental re-layout for live formula editing.
+
+LiveFormula keeps the laid out tree of the current text. An edit reparses
+the new text (the grammar is LALR, so parsing itself is not incremental)
+and then grafts every subtree that also existed before, at the same scale,
+back into the new tree in place of its freshly parsed copy. Only the nodes
+that are really new get their sizes synthesized, positions are only
+recomputed under nodes that moved or are new, and only those nodes' SVG
+fragments are rendered again.
+
+Every node that draws something gets its own fragment, wrapped in
+<g id="f<n>">, so the editor can patch the previous SVG: edit returns the
+ids of fragments to drop and the (id, svg) pairs to add or replace.
+
+The structural keys live in an LRU cache of maxsize structures, so a long
+editing session doesn't keep every structure it ever saw. A structure that
+falls out of the cache gets a new key the next time it is parsed; old
+subtrees with it just aren't reused, they are never confused with others.
+"""
+import itertools
+
+from memo import LRUCache
+
+from parser import parse, TreeBuilder, EmptyLeaf, CharLeaf, ConcatenationOp, \
+    DivisionOp, SuperSubScriptOp, ParenthesesOp, Operation
+import gen
+
+
+class _KeyedBuilder(TreeBuilder):
+    # Tags every node with a structural key (equal keys mean equal
+    # subtrees) and a fragment id.
+
+    def __init__(self, maxsize):
+        self.keys = LRUCache(maxsize)
+        # Keys are never reused, so an evicted structure can't hand its key
+        # to a different one.
+        self.new_keys = itertools.count()
+        self.ids = itertools.count()
+
+    def _tag(self, node, structure):
+        key = self.keys.get(structure)
+        if key is None:
+            key = next(self.new_keys)
+            self.keys.put(structure, key)
+        node.key = key
+        node.fragment_id = next(self.ids)
+        node.claimed = node.claimed_below = None
+        return node
+
+    def empty(self):
+        return self._tag(EmptyLeaf(), ('empty',))
+
+    def char(self, c):
+        return self._tag(CharLeaf(c), ('char', c))
+
+    def concatenation(self, left, right):
+        return self._tag(ConcatenationOp(left, right), ('concat', left.key, right.key))
+
+    def division(self, numerator, denominator):
+        return self._tag(DivisionOp(numerator, denominator),
+                         ('div', numerator.key, denominator.key))
+
+    def scripts(self, script, superscript, subscript):
+        superscript = superscript or self.empty()
+        subscript = subscript or self.empty()
+        return self._tag(SuperSubScriptOp(script, superscript, subscript),
+                         ('scripts', script.key, superscript.key, subscript.key))
+
+    def parentheses(self, child):
+        return self._tag(ParenthesesOp(child), ('paren', child.key))
+
+
+def _fragment(node):
+    svg = ''.join(piece for piece in node.render_sequence()
+                  if not isinstance(piece, Operation))
+    return '<g id="f%d">%s</g>\n' % (node.fragment_id, svg) if svg else None
+
+
+def _walk(root, skip):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if not skip(node):
+            yield node
+            stack.extend(node.subtrees())
+
+
+class LiveFormula(object):
+    def __init__(self, text, scale=1, engine='ply', maxsize=100000):
+        self.scale = scale
+        self.engine = engine
+        self.text = ''
+        self.root = None
+        self.fragments = {}
+        self._builder = _KeyedBuilder(maxsize)
+        self._edits = itertools.count()
+        self.edit(0, 0, text)
+
+    def svg(self, grid='pattern'):
+        return ''.join([gen.HEADER, gen.GRIDS[grid]] +
+                       [self.fragments[i] for i in sorted(self.fragments)] +
+                       [gen.FOOTER])
+
+    def edit(self, start, end, replacement):
+        """Replace text[start:end] with replacement.
+
+        Returns (removed, updated): the fragment ids that are gone and a list
+        of (fragment id, svg) to add or replace. Raises ParseError, leaving
+        the formula untouched, if the new text doesn't parse.
+        """
+        text = self.text[:start] + replacement + self.text[end:]
+        new_root = parse(text, self._builder, self.engine)
+        self.text = text
+        edit = next(self._edits)
+
+        old_root = self.root
+        self.root = self._graft(old_root, new_root, edit)
+
+        removed = []
+        if old_root is not None:
+            for node in _walk(old_root, lambda node: node.claimed == edit):
+                if self.fragments.pop(node.fragment_id, None) is not None:
+                    removed.append(node.fragment_id)
+
+        return removed, self._place(edit)
+
+    def _graft(self, old_root, new_root, edit):
+        reusable = {}
+        if old_root is not None:
+            for node in _walk(old_root, lambda node: False):
+                reusable.setdefault((node.key, node.scale), []).append(node)
+
+        root = None
+        fresh = []
+        stack = [(new_root, self.scale, None, 0)]
+        while stack:
+            node, scale, parent, i = stack.pop()
+            old = self._claim(reusable.get((node.key, scale), ()), edit)
+            if old is not None:
+                node = old
+            else:
+                fresh.append(node)
+                for j, (child, child_scale) in enumerate(node.scale_children(scale)):
+                    stack.append((child, child_scale, node, j))
+
+            if parent is None:
+                root = node
+                node.parent = None
+            else:
+                parent.set_subtree(i, node)
+                node.parent = parent
+
+        # fresh is in pre-order, so reversed it has children before parents.
+        for node in reversed(fresh):
+            node.synthesize_size()
+        return root
+
+    def _claim(self, candidates, edit):
+        # A subtree can be reused once, and not if part of it (or a subtree
+        # containing it) has already been reused.
+        for old in candidates:
+            if old.claimed != edit and old.claimed_below != edit:
+                break
+        else:
+            return None
+
+        for node in _walk(old, lambda node: False):
+            node.claimed = edit
+        ancestor = old.parent
+        while ancestor is not None and ancestor.claimed_below != edit:
+            ancestor.claimed_below = edit
+            ancestor = ancestor.parent
+        return old
+
+    def _place(self, edit):
+        updated = []
+        stack = [(self.root, 0, 0)]
+        while stack:
+            node, x, y = stack.pop()
+            if node.claimed == edit and (node.pos_x, node.pos_y) == (x, y):
+                continue
+            stack.extend(node.position_children(x, y))
+            fragment = _fragment(node)
+            if fragment is not None:
+                self.fragments[node.fragment_id] = fragment
+                updated.append((node.fragment_id, fragment))
+        return updated
@@ -0,0 +1,136 @@
+"""Opt-in instrumentation of the formula pipeline.
+
+    import instrument
+    instrument.add_hook(lambda record: sys.stderr.write('%r\n' % record.as_dict()))
+
+While at least one hook is registered, every gen.render call fills a Record
+with the wall time of each phase and hands it to every hook when the
+formula is done:
+
+    object tree   parse, scale, sizes, positions, render
+    --arrays      parse, scale, sizes, positions, render
+    --memo        parse, sizes, render (positions are set while rendering)
+    --cache       the phases above on a miss, then cache (the lookup and
+                  the store) and write
+
+along with the tokens read, the nodes of the tree, the bytes written and
+whether it was a cache hit or an error. With no hooks the pipeline only
+pays one check per formula.
+
+Python 2 has no tracemalloc: a hook registered with memory=True also gets
+the peak resident set size of the process (resource.getrusage) in the
+record, which is a high-water mark for the whole process rather than for
+the one formula.
+"""
+import resource
+import time
+
+hooks = []
+_memory_hooks = []
+
+
+def add_hook(callback, memory=False):
+    hooks.append(callback)
+    if memory:
+        _memory_hooks.append(callback)
+
+
+def remove_hook(callback):
+    hooks.remove(callback)
+    if callback in _memory_hooks:
+        _memory_hooks.remove(callback)
+
+
+def start(pipeline):
+    """Return a new Record if instrumentation is on, otherwise None."""
+    return Record(pipeline) if hooks else None
+
+
+class Record(object):
+    """The measurements of one formula.
+
+    Used in a with statement, it counts an error if an exception leaves
+    the block and hands itself to the hooks at the end."""
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.phases = []
+        self.counts = {}
+        self.peak_rss_kb = None
+        self._last = time.time()
+
+    def phase(self, name):
+        """Close the phase that started at the previous call (or at the
+        creation of the record) and name it."""
+        now = time.time()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    def skip(self):
+        """Leave the time since the last phase out of every phase, for work
+        done only to fill the record."""
+        self._last = time.time()
+
+    def count(self, name, amount=1):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def counting(self, function, name):
+        # Wraps a function returning tokens or None, counting the tokens.
+        def counted():
+            result = function()
+            if result is not None:
+                self.counts[name] = self.counts.get(name, 0) + 1
+            return result
+        return counted
+
+    def total(self):
+        return sum(seconds for _, seconds in self.phases)
+
+    def as_dict(self):
+        record = {'pipeline': self.pipeline, 'phases': dict(self.phases),
+                  'counts': dict(self.counts), 'total': self.total()}
+        if self.peak_rss_kb is not None:
+            record['peak_rss_kb'] = self.peak_rss_kb
+        return record
+
+    def finish(self):
+        """Hand the record to the hooks."""
+        if _memory_hooks:
+            self.peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        for hook in list(hooks):
+            hook(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.count('errors')
+        self.finish()
+
+
+class CountingWriter(object):
+    """Passes writes on to f, counting the bytes in record."""
+
+    def __init__(self, f, record):
+        self.f = f
+        self.record = record
+
+    def write(self, data):
+        self.record.count('bytes', len(data))
+        self.f.write(data)
+
+
+def count_nodes(root):
+    count = 0
+    stack = [root]
+    while stack:
+        count += 1
+        stack.extend(stack.pop().subtrees())
+    return count
+
+
+def count_tokens(string):
+    # The tokens the lexer makes of string: every character but the
+    # ignored tabs and newlines.
+    return len(string) - string.count('\t') - string.count('\n')
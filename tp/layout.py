@@ -0,0 +1,70 @@
+"""Non-recursive layout and render passes.
+
+These do the same work as Operation.propagate_scale, synthesize_sizes,
+propagate_position and render, but walk the tree with an explicit stack, so
+the Python call depth stays constant no matter how deeply the formula nests.
+"""
+from parser import Operation
+
+_EXIT = object()
+
+
+def layout(root, scale=1, x=0, y=0):
+    synthesize(root, scale)
+    position(root, x, y)
+
+
+def synthesize(root, scale=1):
+    # Scale is inherited and sizes are synthesized, so both fit in a single
+    # depth-first walk: scale on the way down, size on the way back up.
+    stack = [(root, scale)]
+    pop, push, extend = stack.pop, stack.append, stack.extend
+    while stack:
+        node, node_scale = pop()
+        if node_scale is _EXIT:
+            node.synthesize_size()
+        else:
+            push((node, _EXIT))
+            extend(node.scale_children(node_scale))
+
+
+def propagate_scale(root, scale=1):
+    # The scale pass of synthesize on its own, to time it separately.
+    stack = [(root, scale)]
+    pop, extend = stack.pop, stack.extend
+    while stack:
+        node, node_scale = pop()
+        extend(node.scale_children(node_scale))
+
+
+def synthesize_sizes(root):
+    # The size pass of synthesize on its own; scales must be set already.
+    stack = [(root, False)]
+    pop, push = stack.pop, stack.append
+    while stack:
+        node, done = pop()
+        if done:
+            node.synthesize_size()
+        else:
+            push((node, True))
+            for child in node.subtrees():
+                push((child, False))
+
+
+def position(root, x=0, y=0):
+    stack = [(root, x, y)]
+    pop, extend = stack.pop, stack.extend
+    while stack:
+        node, node_x, node_y = pop()
+        extend(node.position_children(node_x, node_y))
+
+
+def render(root, fout):
+    stack = [root]
+    pop, extend, write = stack.pop, stack.extend, fout.write
+    while stack:
+        item = pop()
+        if isinstance(item, Operation):
+            extend(reversed(item.render_sequence()))
+        else:
+            write(item)
@@ -29,4 +29,18 @@ def t_error(t):
     print("Illegal character '%s'" % t.value[0])
     t.lexer.skip(1)
 
-lexer = lex.lex()
\ No newline at end of file
+_lexer = None
+
+
+def get_lexer():
+    """Build the lexer on first use, from the tables in formula_lextab.py
+    (see build_tables.py) when they are there."""
+    global _lexer
+    if _lexer is None:
+        try:
+            import formula_lextab
+        except ImportError:
+            _lexer = lex.lex()
+        else:
+            _lexer = lex.lex(optimize=1, lextab=formula_lextab)
+    return _lexer
@@ -0,0 +1,175 @@
+"""Hash-consed formula trees with memoized layout.
+
+HashConsingBuilder makes identical subexpressions share a single Operation
+node, so the parse result is a DAG (except that the base of a script is
+never the same object as its superscript or subscript, see scripts). A subtree's size depends only on its
+structure and its scale, so MemoLayout computes it once per (node, scale)
+pair and keeps it in an LRU cache that outlives the formula, e.g. across a
+gen.py batch.
+
+Positions can't be shared (the same node sits somewhere else each time it
+appears), so render recomputes them on the way down, loading the cached
+sizes into each node right before using it.
+"""
+from collections import OrderedDict
+import copy
+import itertools
+
+from parser import parse, TreeBuilder, EmptyLeaf, CharLeaf, ConcatenationOp, \
+    DivisionOp, SuperSubScriptOp, ParenthesesOp
+
+# Node ids are never reused, so a key built from them can't go stale when
+# one of the nodes it mentions is evicted.
+_uids = itertools.count()
+
+
+class LRUCache(object):
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        try:
+            value = self._entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._entries.pop(key, None)
+        self._entries[key] = value
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+class HashConsingBuilder(TreeBuilder):
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.empty = EmptyLeaf()
+        self.empty.uid = next(_uids)
+
+    def _intern(self, key, cls, *args):
+        node = self.nodes.get(key)
+        if node is None:
+            node = cls(*args)
+            node.uid = next(_uids)
+            self.nodes.put(key, node)
+        return node
+
+    def char(self, c):
+        return self._intern(('char', c), CharLeaf, c)
+
+    def concatenation(self, left, right):
+        return self._intern(('concat', left.uid, right.uid),
+                            ConcatenationOp, left, right)
+
+    def division(self, numerator, denominator):
+        return self._intern(('div', numerator.uid, denominator.uid),
+                            DivisionOp, numerator, denominator)
+
+    def scripts(self, script, superscript, subscript):
+        superscript = superscript or self.empty
+        subscript = subscript or self.empty
+        if script is superscript or script is subscript:
+            # Laying out a node stores its children's sizes on the children,
+            # and the base is at a different scale than the scripts, so it
+            # can't be the same object as one of them. The copy keeps the
+            # uid: its size at each scale is the same.
+            script = copy.copy(script)
+        return self._intern(('scripts', script.uid, superscript.uid, subscript.uid),
+                            SuperSubScriptOp, script, superscript, subscript)
+
+    def parentheses(self, child):
+        return self._intern(('paren', child.uid), ParenthesesOp, child)
+
+
+class MemoLayout(object):
+    def __init__(self, maxsize=100000):
+        self.nodes = LRUCache(maxsize)
+        self.sizes = LRUCache(maxsize)
+        self.builder = HashConsingBuilder(self.nodes)
+
+    def parse(self, string, engine='ply', record=None):
+        return parse(string, self.builder, engine, record)
+
+    def layout(self, root, scale=1):
+        """Return {(node uid, scale): (width, height, div_line_offset)} for
+        every node under root, computing only the pairs not in the cache."""
+        sizes = {}
+        stack = [(root, scale, False)]
+        pop, push = stack.pop, stack.append
+        while stack:
+            node, node_scale, done = pop()
+            key = (node.uid, node_scale)
+            if done:
+                for child, child_scale in node.scale_children(node_scale):
+                    child.width, child.height, child.div_line_offset = \
+                        sizes[(child.uid, child_scale)]
+                node.synthesize_size()
+                sizes[key] = (node.width, node.height, node.div_line_offset)
+                self.sizes.put(key, sizes[key])
+            elif key not in sizes:
+                cached = self.sizes.get(key)
+                if cached is not None:
+                    sizes[key] = cached
+                    continue
+                push((node, node_scale, True))
+                for child, child_scale in node.scale_children(node_scale):
+                    push((child, child_scale, False))
+        return sizes
+
+    def _size(self, node, scale, sizes):
+        # Subtrees that hit the cache in layout weren't descended into, so
+        # their children's sizes are looked up (or recomputed) on demand.
+        key = (node.uid, scale)
+        size = sizes.get(key)
+        if size is None:
+            size = self.sizes.get(key)
+            if size is None:
+                sizes.update(self.layout(node, scale))
+                size = sizes[key]
+            sizes[key] = size
+        return size
+
+    def render(self, root, fout, scale=1, x=0, y=0, sizes=None):
+        """Render root, laying it out first unless sizes (what layout(root,
+        scale) returned) is given."""
+        if sizes is None:
+            sizes = self.layout(root, scale)
+        size = self._size
+
+        stack = [(root, scale, x, y)]
+        pop, push, write = stack.pop, stack.append, fout.write
+        while stack:
+            item = pop()
+            if item.__class__ is str:
+                write(item)
+                continue
+
+            node, node_scale, node_x, node_y = item
+            node.width, node.height, node.div_line_offset = size(node, node_scale, sizes)
+            child_scales = []
+            for child, child_scale in node.scale_children(node_scale):
+                child.width, child.height, child.div_line_offset = \
+                    size(child, child_scale, sizes)
+                child_scales.append(child_scale)
+
+            # position_children and render_sequence list the children in
+            # the same order as scale_children.
+            placed = iter(zip(child_scales, node.position_children(node_x, node_y)))
+            items = []
+            for piece in node.render_sequence():
+                if piece.__class__ is str:
+                    items.append(piece)
+                else:
+                    child_scale, (child, child_x, child_y) = next(placed)
+                    items.append((child, child_scale, child_x, child_y))
+            for piece in reversed(items):
+                push(piece)
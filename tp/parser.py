@@ -1,31 +1,127 @@
+import sys
+
 import ply.yacc as yacc
 
 # Get the token map from the lexer.
-from lexer import tokens
+from lexer import tokens, get_lexer
+
+
+class ParseError(Exception):
+    pass
+
+
+# Characters that can't appear as they are in the text of an SVG element.
+XML_ESCAPES = {'<': '&lt;', '>': '&gt;', '&': '&amp;'}
+
+
+def char_svg(c, x, y, height, scale):
+    return '<text x="%s" y="%s" font-size="%s">%s</text>\n' % (
+        x, y + height, scale, XML_ESCAPES.get(c, c))
+
+
+def division_line_svg(x, y, div_line_offset, width, scale):
+    return '<line x1="%s" y1="%s" x2="%s" y2="%s" stroke-width="%s" stroke="black"/>\n' % (
+        x, y + div_line_offset, x + width, y + div_line_offset, scale * 0.06)
+
+
+def parenthesis_svg(paren, x, y, height, scale):
+    return '<text x="0" y="0" font-size="%s" transform="translate(%s,%s) scale(1,%s)">%s</text>' % (
+        scale, x, y + height * .85, height / scale / .77, paren)
+
+
+def formula_text(node):
+    """The text of the formula under node, built when asked for.
+
+    Inner nodes don't keep their own copy of it: joining the children's
+    text in every constructor made parsing quadratic in the length of the
+    formula. This walks the subtree once, with an explicit stack so deep
+    formulas don't hit the recursion limit.
+    """
+    pieces = []
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, Operation):
+            stack.extend(reversed(item.text_sequence()))
+        else:
+            pieces.append(item)
+    return ''.join(pieces)
 
 
 class Operation(object):
-    def render(self, fout):
+    # Each node knows how to do its own step of every pass (scale_children,
+    # synthesize_size, position_children, render_sequence). The recursive
+    # passes below just walk the tree calling them; layout.py walks it with
+    # an explicit stack instead.
+
+    def subtrees(self):
         raise NotImplementedError('subclass responsibility')
 
+    def scale_children(self, scale):
+        raise NotImplementedError('subclass responsibility')
 
-class EmptyLeaf(Operation):
-    def __init__(self):
-        self.value = ""
-        self.scale = self.width = self.height = self.pos_x = self.pos_y = 0
+    def synthesize_size(self):
+        raise NotImplementedError('subclass responsibility')
+
+    def position_children(self, x, y):
+        raise NotImplementedError('subclass responsibility')
+
+    def render_sequence(self):
+        raise NotImplementedError('subclass responsibility')
+
+    def text_sequence(self):
+        # The strings and subtrees whose text, in order, is this node's.
+        raise NotImplementedError('subclass responsibility')
+
+    def set_subtree(self, i, node):
+        # Replaces the i-th of subtrees().
+        raise NotImplementedError('subclass responsibility')
 
     def propagate_scale(self, scale):
-        pass
+        for child, child_scale in self.scale_children(scale):
+            child.propagate_scale(child_scale)
 
     def synthesize_sizes(self):
-        pass
+        for child in self.subtrees():
+            child.synthesize_sizes()
+        self.synthesize_size()
 
     def propagate_position(self, x, y):
-        pass
+        for child, child_x, child_y in self.position_children(x, y):
+            child.propagate_position(child_x, child_y)
 
     def render(self, fout):
+        for item in self.render_sequence():
+            if isinstance(item, Operation):
+                item.render(fout)
+            else:
+                fout.write(item)
+
+
+class EmptyLeaf(Operation):
+    def __init__(self):
+        self.value = ""
+        self.scale = self.width = self.height = self.pos_x = self.pos_y = 0
+        self.div_line_offset = 0
+
+    def subtrees(self):
+        return ()
+
+    def scale_children(self, scale):
+        return ()
+
+    def synthesize_size(self):
         pass
 
+    def position_children(self, x, y):
+        return ()
+
+    def render_sequence(self):
+        return ()
+
+    def text_sequence(self):
+        return ()
+
     def __repr__(self):
         return "EmptyLeaf"
 
@@ -35,24 +131,28 @@ class CharLeaf(Operation):
         self.value = c
         self.scale = self.width = self.height = self.pos_x = self.pos_y = -1
 
-    def propagate_scale(self, scale):
+    def subtrees(self):
+        return ()
+
+    def scale_children(self, scale):
         self.scale = scale
+        return ()
 
-    def synthesize_sizes(self):
+    def synthesize_size(self):
         self.width = self.scale * .6
         self.height = self.scale
         self.div_line_offset = self.scale * .72
 
-    def propagate_position(self, x, y):
+    def position_children(self, x, y):
         self.pos_x = x
         self.pos_y = y
+        return ()
 
-    def render(self, fout):
-        fout.write('<text x="' + str(self.pos_x) +
-                   '" y="' + str(self.pos_y + self.height) +
-                   '" font-size="' + str(self.scale) +
-                   '">' + self.value +
-                   '</text>\n')
+    def render_sequence(self):
+        return (char_svg(self.value, self.pos_x, self.pos_y, self.height, self.scale),)
+
+    def text_sequence(self):
+        return (self.value,)
 
     def __repr__(self):
         return "Leaf" + repr((self.value,
@@ -64,37 +164,53 @@ class CharLeaf(Operation):
 
 
 class ConcatenationOp(Operation):
-    def __init__(self, child1, child2):
-        self.value = child1.value + child2.value
-        self.children = [child1, child2]
+    # N-ary: the parser appends each new term to the same node instead of
+    # nesting binary ones, so long juxtapositions stay one level deep.
+
+    def __init__(self, *children):
+        self.children = list(children)
         self.scale = self.width = self.height = self.pos_x = self.pos_y = -1
 
-    def propagate_scale(self, scale):
-        self.scale = scale
-        self.children[0].propagate_scale(scale)
-        self.children[1].propagate_scale(scale)
+    value = property(formula_text)
 
-    def synthesize_sizes(self):
-        self.children[0].synthesize_sizes()
-        self.children[1].synthesize_sizes()
-        self.width = self.children[0].width + self.children[1].width
-        self.height = max(self.children[0].height, self.children[1].height)
-        self.div_line_offset = max(
-            self.children[0].div_line_offset, self.children[1].div_line_offset)
+    def append(self, child):
+        self.children.append(child)
 
-    def propagate_position(self, x, y):
+    def subtrees(self):
+        return self.children
+
+    def set_subtree(self, i, node):
+        self.children[i] = node
+
+    def scale_children(self, scale):
+        self.scale = scale
+        return [(child, scale) for child in self.children]
+
+    def synthesize_size(self):
+        width = height = div_line_offset = 0
+        for child in self.children:
+            width += child.width
+            height = max(height, child.height)
+            div_line_offset = max(div_line_offset, child.div_line_offset)
+        self.width = width
+        self.height = height
+        self.div_line_offset = div_line_offset
+
+    def position_children(self, x, y):
         self.pos_x = x
         self.pos_y = y
-        self.children[0].propagate_position(
-            x,
-            y + self.div_line_offset - self.children[0].div_line_offset)
-        self.children[1].propagate_position(
-            x + self.children[0].width,
-            y + self.div_line_offset - self.children[1].div_line_offset)
+        placed = []
+        offset = 0
+        for child in self.children:
+            placed.append((child, x + offset, y + self.div_line_offset - child.div_line_offset))
+            offset += child.width
+        return placed
 
-    def render(self, fout):
-        self.children[0].render(fout)
-        self.children[1].render(fout)
+    def render_sequence(self):
+        return self.children
+
+    def text_sequence(self):
+        return self.children
 
     def __repr__(self):
         return "Concat" + repr((self.value,
@@ -107,43 +223,47 @@ class ConcatenationOp(Operation):
 
 
 class DivisionOp(Operation):
+    value = property(formula_text)
+
     def __init__(self, child1, child2):
-        self.value = child1.value + '/' + child2.value
         self.children = [child1, child2]
         self.scale = self.width = self.height = self.pos_x = self.pos_y = -1
 
-    def propagate_scale(self, scale):
+    def subtrees(self):
+        return self.children
+
+    def set_subtree(self, i, node):
+        self.children[i] = node
+
+    def scale_children(self, scale):
         self.scale = scale
-        self.children[0].propagate_scale(scale)
-        self.children[1].propagate_scale(scale)
+        return ((self.children[0], scale), (self.children[1], scale))
 
-    def synthesize_sizes(self):
-        self.children[0].synthesize_sizes()
-        self.children[1].synthesize_sizes()
+    def synthesize_size(self):
         self.width = max(self.children[0].width, self.children[1].width)
         self.height = self.children[0].height + \
             self.children[1].height + self.scale * .3
         self.div_line_offset = self.children[0].height + self.scale * .3
 
-    def propagate_position(self, x, y):
+    def position_children(self, x, y):
         self.pos_x = x
         self.pos_y = y
         up_y = self.pos_y
         down_y = self.pos_y + self.div_line_offset
-        self.children[0].propagate_position(
-            x + (self.width - self.children[0].width) / 2, up_y)
-        self.children[1].propagate_position(
-            x + (self.width - self.children[1].width) / 2, down_y)
+        return ((self.children[0],
+                 x + (self.width - self.children[0].width) / 2, up_y),
+                (self.children[1],
+                 x + (self.width - self.children[1].width) / 2, down_y))
 
-    def render(self, fout):
-        self.children[0].render(fout)
-        fout.write('<line x1="' + str(self.pos_x) +
-                   '" y1="' + str(self.pos_y + self.div_line_offset) +
-                   '" x2="' + str(self.pos_x + max(self.children[0].width, self.children[1].width)) +
-                   '" y2="' + str(self.pos_y + self.div_line_offset) +
-                   '" stroke-width="' + str(self.scale * 0.06) +
-                   '" stroke="black"/>\n')
-        self.children[1].render(fout)
+    def render_sequence(self):
+        return (self.children[0],
+                division_line_svg(self.pos_x, self.pos_y, self.div_line_offset,
+                                  max(self.children[0].width, self.children[1].width),
+                                  self.scale),
+                self.children[1])
+
+    def text_sequence(self):
+        return (self.children[0], '/', self.children[1])
 
     def __repr__(self):
         return "Div" + repr((self.value,
@@ -156,25 +276,34 @@ class DivisionOp(Operation):
 
 
 class SuperSubScriptOp(Operation):
+    value = property(formula_text)
+
     def __init__(self, script, superscript=None, subscript=None):
         superscript = superscript or EmptyLeaf()
         subscript = subscript or EmptyLeaf()
-        self.value = script.value + '^' + superscript.value + '_' + subscript.value
         self.script = script
         self.superscript = superscript
         self.subscript = subscript
         self.scale = self.width = self.height = self.pos_x = self.pos_y = -1
 
-    def propagate_scale(self, scale):
+    def subtrees(self):
+        return (self.script, self.superscript, self.subscript)
+
+    def set_subtree(self, i, node):
+        if i == 0:
+            self.script = node
+        elif i == 1:
+            self.superscript = node
+        else:
+            self.subscript = node
+
+    def scale_children(self, scale):
         self.scale = scale
-        self.script.propagate_scale(scale)
-        self.superscript.propagate_scale(scale * .7)
-        self.subscript.propagate_scale(scale * .7)
+        return ((self.script, scale),
+                (self.superscript, scale * .7),
+                (self.subscript, scale * .7))
 
-    def synthesize_sizes(self):
-        self.script.synthesize_sizes()
-        self.superscript.synthesize_sizes()
-        self.subscript.synthesize_sizes()
+    def synthesize_size(self):
         self.width = self.script.width + \
             max(self.superscript.width, self.subscript.width)
 
@@ -185,21 +314,21 @@ class SuperSubScriptOp(Operation):
         self.div_line_offset = self.script.div_line_offset + max(
             0, self.superscript.height - self.script.height * .5)
 
-    def propagate_position(self, x, y):
+    def position_children(self, x, y):
         self.pos_x = x
         self.pos_y = y
-        self.script.propagate_position(x, y + max(
-            0, self.superscript.height - self.script.height * .5))
-        self.superscript.propagate_position(
-            x + self.script.width, y)
-        self.subscript.propagate_position(
-            x + self.script.width,
-            y + self.script.height * .2 + max(self.script.height * .5, self.superscript.height))
+        return ((self.script, x, y + max(
+                    0, self.superscript.height - self.script.height * .5)),
+                (self.superscript, x + self.script.width, y),
+                (self.subscript,
+                 x + self.script.width,
+                 y + self.script.height * .2 + max(self.script.height * .5, self.superscript.height)))
 
-    def render(self, fout):
-        self.script.render(fout)
-        self.superscript.render(fout)
-        self.subscript.render(fout)
+    def render_sequence(self):
+        return (self.script, self.superscript, self.subscript)
+
+    def text_sequence(self):
+        return (self.script, '^', self.superscript, '_', self.subscript)
 
     def __repr__(self):
         return "SuperSub" + repr((self.value,
@@ -210,36 +339,40 @@ class SuperSubScriptOp(Operation):
 
 
 class ParenthesesOp(Operation):
+    value = property(formula_text)
+
     def __init__(self, child):
         self.child = child
-        self.value = '(' + child.value + ')'
         self.scale = self.width = self.height = self.pos_x = self.pos_y = -1
 
-    def propagate_scale(self, scale):
-        self.child.propagate_scale(scale)
+    def subtrees(self):
+        return (self.child,)
+
+    def set_subtree(self, i, node):
+        self.child = node
+
+    def scale_children(self, scale):
         self.scale = scale
+        return ((self.child, scale),)
 
-    def synthesize_sizes(self):
-        self.child.synthesize_sizes()
+    def synthesize_size(self):
         self.width = self.scale * 1.2 + self.child.width
         self.height = self.child.height
         self.div_line_offset = self.child.div_line_offset
 
-    def propagate_position(self, x, y):
+    def position_children(self, x, y):
         self.pos_x = x
         self.pos_y = y
-        self.child.propagate_position(x + 0.6 * self.scale, y)
+        return ((self.child, x + 0.6 * self.scale, y),)
 
-    def render(self, fout):
-        fout.write('<text x="0" y="0" font-size="' + str(self.scale) +
-                   '" transform="translate(' + str(self.pos_x) +
-                   ',' + str(self.pos_y + self.height * .85) +
-                   ') scale(1,' + str(self.height / self.scale / .77) + ')">(</text>')
-        self.child.render(fout)
-        fout.write('<text x="0" y="0" font-size="' + str(self.scale) +
-                   '" transform="translate(' + str(self.pos_x + self.child.width + 0.6 * self.scale) +
-                   ',' + str(self.pos_y + self.height * .85) +
-                   ') scale(1,' + str(self.height / self.scale / .77) + ')">)</text>')
+    def render_sequence(self):
+        return (parenthesis_svg('(', self.pos_x, self.pos_y, self.height, self.scale),
+                self.child,
+                parenthesis_svg(')', self.pos_x + self.child.width + 0.6 * self.scale,
+                                self.pos_y, self.height, self.scale))
+
+    def text_sequence(self):
+        return ('(', self.child, ')')
 
     def __repr__(self):
         return "Parentheses" + repr((self.value,
@@ -251,17 +384,40 @@ class ParenthesesOp(Operation):
                                      self.child))
 
 
+class TreeBuilder(object):
+    # The grammar actions build nodes through parser.builder, so the same
+    # grammar can produce other tree representations (see compact.py).
+
+    def char(self, c):
+        return CharLeaf(c)
+
+    def concatenation(self, left, right):
+        if isinstance(left, ConcatenationOp):
+            left.append(right)
+            return left
+        return ConcatenationOp(left, right)
+
+    def division(self, numerator, denominator):
+        return DivisionOp(numerator, denominator)
+
+    def scripts(self, script, superscript, subscript):
+        return SuperSubScriptOp(script, superscript, subscript)
+
+    def parentheses(self, child):
+        return ParenthesesOp(child)
+
+
 start = 'expression'
 
 
 def p_expression_slash(p):
     'expression : expression SLASH concat'
-    p[0] = DivisionOp(p[1], p[3])
+    p[0] = p.parser.builder.division(p[1], p[3])
 
 
 def p_concat_1(p):
     'concat : concat term'
-    p[0] = ConcatenationOp(p[1], p[2])
+    p[0] = p.parser.builder.concatenation(p[1], p[2])
 
 
 def p_pass_through(p):
@@ -273,27 +429,27 @@ def p_pass_through(p):
 
 def p_term_1(p):
     'term : factor CARET factor'
-    p[0] = SuperSubScriptOp(p[1], p[3], None)
+    p[0] = p.parser.builder.scripts(p[1], p[3], None)
 
 
 def p_term_2(p):
     'term : factor UNDERSCORE factor'
-    p[0] = SuperSubScriptOp(p[1], None, p[3])
+    p[0] = p.parser.builder.scripts(p[1], None, p[3])
 
 
 def p_term_3(p):
     'term : factor CARET factor UNDERSCORE factor'
-    p[0] = SuperSubScriptOp(p[1], p[3], p[5])
+    p[0] = p.parser.builder.scripts(p[1], p[3], p[5])
 
 
 def p_term_4(p):
     'term : factor UNDERSCORE factor CARET factor'
-    p[0] = SuperSubScriptOp(p[1], p[5], p[3])
+    p[0] = p.parser.builder.scripts(p[1], p[5], p[3])
 
 
 def p_factor_paren(p):
     'factor : LPAREN expression RPAREN'
-    p[0] = ParenthesesOp(p[2])
+    p[0] = p.parser.builder.parentheses(p[2])
 
 
 def p_factor_brace(p):
@@ -303,12 +459,63 @@ def p_factor_brace(p):
 
 def p_factor(p):
     'factor : CHAR'
-    p[0] = CharLeaf(p[1])
+    p[0] = p.parser.builder.char(p[1])
 
 
 def p_error(p):
-    print("Syntax error in input!")
-
-
-# Build the parser
-parser = yacc.yacc()
+    if p is None:
+        raise ParseError("Syntax error in input: unexpected end of input")
+    raise ParseError("Syntax error in input: unexpected '%s' at position %d" %
+                     (p.value, p.lexpos))
+
+
+_parser = None
+
+
+def get_parser():
+    """Build the parser on first use.
+
+    The LALR tables come from formula_parsetab.py (see build_tables.py) if
+    its signature still matches the grammar; otherwise they are regenerated
+    in memory. Nothing is ever written to disk.
+    """
+    global _parser
+    if _parser is None:
+        try:
+            import formula_parsetab as tables
+        except ImportError:
+            tables = 'formula_parsetab'
+        _parser = yacc.yacc(module=sys.modules[__name__], tabmodule=tables,
+                            debug=False, write_tables=False)
+        _parser.builder = TreeBuilder()
+    return _parser
+
+
+def parse(string, builder=None, engine='ply', record=None):
+    """Parse string, building the tree with builder (a TreeBuilder by
+    default).
+
+    engine='fast' uses the hand-written parser in fastparse.py instead of
+    PLY; both build the same trees. With an instrumentation record, the
+    tokens read are counted in it.
+    """
+    if engine == 'fast':
+        import fastparse
+        tree = fastparse.parse(string, builder)
+        if record is not None:
+            import instrument
+            record.count('tokens', instrument.count_tokens(string))
+        return tree
+
+    parser = get_parser()
+    lexer = get_lexer()
+    tokenfunc = None if record is None else record.counting(lexer.token, 'tokens')
+    if builder is None:
+        return parser.parse(string, lexer=lexer, tokenfunc=tokenfunc)
+
+    previous = parser.builder
+    parser.builder = builder
+    try:
+        return parser.parse(string, lexer=lexer, tokenfunc=tokenfunc)
+    finally:
+        parser.builder = previous
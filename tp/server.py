@@ -0,0 +1,385 @@
+"""Local render server for formulas and dibu drawings.
+
+    python server.py [--port PORT | --unix PATH] [--workers N]
+                     [--batch-size N] [--batch-window MS] [--queue-size N]
+
+POST a formula to /tp, or a dibu program to /dibu, and the response is the
+SVG (400 with the error message if it doesn't parse; bodies need a
+Content-Length of at most MAX_REQUEST_BYTES). GET /stats returns
+the server counters as JSON. /dibu is only available when the dibu package
+can be imported.
+
+Requests are queued and a batcher thread groups the ones that arrive close
+together into micro-batches, which are rendered by a pool of worker
+processes that keep their parsers built between batches. When all workers
+are busy the queue fills up, and once it is full new requests are turned
+away with 503 instead of waiting. Python 2 has no asyncio, so connections
+are served by threads; they only wait on the queue, all rendering happens
+in the workers.
+"""
+import argparse
+import BaseHTTPServer
+import httplib
+import json
+import multiprocessing
+import os
+import Queue
+import socket
+import SocketServer
+import sys
+import threading
+import time
+import traceback
+
+from emitter import bytearray_emitter
+from parser import ParseError
+import gen
+
+try:
+    import dibu
+    from dibu.exceptions import SemanticException, SyntacticException
+except ImportError:
+    dibu = None
+
+KINDS = ('tp', 'dibu') if dibu is not None else ('tp',)
+
+# How long a request waits for its render before giving up with 504.
+RENDER_TIMEOUT = 60
+
+# Larger request bodies are turned away with 413 without being read.
+MAX_REQUEST_BYTES = 1 << 20
+
+# The render options of the workers, set by the pool initializer.
+_options = {}
+
+
+class Busy(Exception):
+    pass
+
+
+def render_job(kind, source):
+    """Render one request, returning (HTTP status, body)."""
+    try:
+        if kind == 'tp':
+            svg = bytearray()
+            with bytearray_emitter(svg) as out:
+                gen.render(source, out, **_options)
+            return 200, str(svg)
+        return 200, dibu.parse(source)
+    except ParseError as e:
+        return 400, str(e)
+    except Exception as e:
+        if dibu is not None and isinstance(e, (SemanticException, SyntacticException)):
+            return 400, str(e)
+        return 500, traceback.format_exc()
+
+
+def render_jobs(jobs):
+    """Render a batch. Never raises: the pool only calls back on success,
+    so a batch that failed as a whole would leave its requests waiting."""
+    results = []
+    for kind, source in jobs:
+        try:
+            results.append(render_job(kind, source))
+        except BaseException:
+            results.append((500, traceback.format_exc()))
+    return results
+
+
+def _start_worker(options):
+    _options.update(options)
+    # Build the parsers now rather than on the first request.
+    render_job('tp', 'a')
+    if dibu is not None:
+        render_job('dibu', 'size height=1, width=1')
+
+
+class _Pending(object):
+    def __init__(self, kind, source):
+        self.kind = kind
+        self.source = source
+        self.result = None
+        self.done = threading.Event()
+
+
+class RenderQueue(object):
+    """Micro-batches submitted jobs and renders them on a process pool.
+
+    At most 2 * workers batches are rendering at a time. While that many are
+    in flight new jobs wait in a queue of queue_size, and once that is full
+    submit raises Busy. With workers=0 batches are rendered by the batcher
+    thread itself.
+
+    The pool never calls back for a batch whose worker died or whose
+    results didn't pickle, so a watcher thread waits on every batch for
+    RENDER_TIMEOUT and fails the ones that didn't make it with 500,
+    freeing their slot.
+    """
+
+    def __init__(self, workers=None, batch_size=32, batch_window=0.002, queue_size=256,
+                 **options):
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.queue = Queue.Queue(queue_size)
+        self.lock = threading.Lock()
+        self.counters = {'accepted': 0, 'rejected': 0, 'batches': 0, 'lost': 0}
+
+        if workers:
+            self.pool = multiprocessing.Pool(workers, _start_worker, (options,))
+            self.in_flight = threading.Semaphore(2 * workers)
+        else:
+            _start_worker(options)
+            self.pool = None
+            self.in_flight = threading.Semaphore(1)
+
+        self.batcher = threading.Thread(target=self._batch_forever)
+        self.batcher.daemon = True
+        self.batcher.start()
+
+        self.rendering = Queue.Queue()
+        self.watcher = threading.Thread(target=self._watch_forever)
+        self.watcher.daemon = True
+        self.watcher.start()
+
+    def submit(self, kind, source):
+        pending = _Pending(kind, source)
+        try:
+            self.queue.put_nowait(pending)
+        except Queue.Full:
+            self._count('rejected')
+            raise Busy()
+        self._count('accepted')
+        return pending
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        stats['queued'] = self.queue.qsize()
+        stats['mean_batch'] = float(stats['accepted'] - stats['queued']) / stats['batches'] \
+            if stats['batches'] else 0.0
+        return stats
+
+    def close(self):
+        self.queue.put(None)
+        self.batcher.join()
+        self.rendering.put(None)
+        self.watcher.join()
+        if self.pool is not None:
+            if self.counters['lost']:
+                # The pool waits for the results of lost batches forever.
+                self.pool.terminate()
+            else:
+                self.pool.close()
+            self.pool.join()
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def _next_batch(self):
+        first = self.queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.time() + self.batch_window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            try:
+                pending = self.queue.get(remaining > 0, max(remaining, 0))
+            except Queue.Empty:
+                break
+            if pending is None:
+                # Finish this batch and stop after it.
+                self.queue.put(None)
+                break
+            batch.append(pending)
+        return batch
+
+    def _batch_forever(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._count('batches')
+            self.in_flight.acquire()
+            jobs = [(pending.kind, pending.source) for pending in batch]
+            deliver = self._deliverer(batch)
+            if self.pool is None:
+                deliver(render_jobs(jobs))
+                continue
+            try:
+                result = self.pool.apply_async(render_jobs, (jobs,), callback=deliver)
+            except Exception:
+                deliver([(500, traceback.format_exc())] * len(batch))
+                continue
+            self.rendering.put((time.time() + RENDER_TIMEOUT, result, deliver, len(batch)))
+
+    def _watch_forever(self):
+        # Batches are watched in the order they were sent, so their
+        # deadlines only grow and one wait at a time is enough.
+        while True:
+            watched = self.rendering.get()
+            if watched is None:
+                return
+            deadline, result, deliver, size = watched
+            result.wait(max(deadline - time.time(), 0))
+            if not result.ready():
+                self._count('lost')
+                deliver([(500, 'The render worker was lost\n')] * size)
+            elif not result.successful():
+                try:
+                    result.get()
+                except Exception:
+                    deliver([(500, traceback.format_exc())] * size)
+
+    def _deliverer(self, batch):
+        # Both the pool and the watcher may deliver a batch: only the first
+        # one counts, so the slot is freed exactly once.
+        delivered = []
+
+        def deliver(results):
+            with self.lock:
+                if delivered:
+                    return
+                delivered.append(True)
+            self.in_flight.release()
+            for pending, result in zip(batch, results):
+                pending.result = result
+                pending.done.set()
+        return deliver
+
+
+class RenderHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Send each response in one write (flushed after every request), so
+    # the headers and body don't end up in separate delayed packets.
+    wbufsize = -1
+    timeout = 60
+
+    def do_POST(self):
+        kind = self.path.strip('/')
+        try:
+            length = int(self.headers.getheader('Content-Length'))
+        except (TypeError, ValueError):
+            length = -1
+        if length < 0:
+            self.close_connection = 1
+            self._respond(411, 'Content-Length required', {'Connection': 'close'})
+            return
+        if length > MAX_REQUEST_BYTES:
+            self.close_connection = 1
+            self._respond(413, 'Request body too large', {'Connection': 'close'})
+            return
+        source = self.rfile.read(length)
+        if kind not in KINDS:
+            self._respond(404, 'Unknown renderer: %s' % kind)
+            return
+        try:
+            pending = self.server.render_queue.submit(kind, source)
+        except Busy:
+            self._respond(503, 'Render queue full', {'Retry-After': '1'})
+            return
+        if not pending.done.wait(RENDER_TIMEOUT):
+            self._respond(504, 'Render timed out')
+            return
+        status, body = pending.result
+        self._respond(status, body, {'Content-Type': 'image/svg+xml'} if status == 200 else {})
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._respond(200, json.dumps(self.server.render_queue.stats()),
+                          {'Content-Type': 'application/json'})
+        else:
+            self._respond(404, 'Not found')
+
+    def _respond(self, status, body, headers={}):
+        self.send_response(status)
+        self.send_header('Content-Type', headers.get('Content-Type', 'text/plain'))
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            if name != 'Content-Type':
+                self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket clients have no address.
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class TCPRenderServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+
+class UnixRenderServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def make_server(render_queue, port=None, unix=None, host='127.0.0.1', verbose=False):
+    """Create (but don't start) a server on a TCP port or a Unix socket."""
+    if unix is not None:
+        if os.path.exists(unix):
+            os.unlink(unix)
+        server = UnixRenderServer(unix, RenderHandler)
+    else:
+        server = TCPRenderServer((host, port or 0), RenderHandler)
+    server.render_queue = render_queue
+    server.verbose = verbose
+    return server
+
+
+class UnixHTTPConnection(httplib.HTTPConnection):
+    """httplib connection to a server listening on a Unix socket."""
+
+    def __init__(self, path, timeout=60):
+        httplib.HTTPConnection.__init__(self, 'localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Serve formula and dibu renders over HTTP')
+    where = argparser.add_mutually_exclusive_group()
+    where.add_argument('--port', type=int, default=8000)
+    where.add_argument('--unix', metavar='PATH', help='listen on a Unix socket instead')
+    argparser.add_argument('--workers', type=int, default=None,
+                           help='render processes (default: one per CPU, 0 renders in the server)')
+    argparser.add_argument('--batch-size', type=int, default=32)
+    argparser.add_argument('--batch-window', type=float, default=2,
+                           help='milliseconds to wait for a batch to fill up')
+    argparser.add_argument('--queue-size', type=int, default=256,
+                           help='requests that may wait before new ones get 503')
+    argparser.add_argument('--grid', choices=sorted(gen.GRIDS), default='pattern')
+    argparser.add_argument('--parser', choices=('ply', 'fast'), default='ply')
+    argparser.add_argument('--verbose', action='store_true', help='log every request')
+    args = argparser.parse_args()
+
+    render_queue = RenderQueue(args.workers, args.batch_size, args.batch_window / 1000.0,
+                               args.queue_size, grid=args.grid, engine=args.parser)
+    server = make_server(render_queue, port=args.port, unix=args.unix, verbose=args.verbose)
+    sys.stderr.write('serving %s on %s\n' % (', '.join('/' + kind for kind in KINDS),
+                                             args.unix or 'http://127.0.0.1:%d' % args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        render_queue.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
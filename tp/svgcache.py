@@ -0,0 +1,214 @@
+"""Persistent, content-addressed cache of rendered formulas.
+
+    python svgcache.py stats DIR
+    python svgcache.py clear DIR
+
+Each entry is the SVG body of one formula (everything between the header
+and the footer, which depend only on the grid option) stored in
+DIR/<xx>/<sha1>.svg. The key hashes the formula, the layout backend that
+rendered it (tree, arrays or memo: they don't format numbers alike) and a
+fingerprint of the parsing, layout and rendering code, so entries written by
+a different version of the code are never used.
+
+Entries are written to a temporary file and renamed into place, so several
+batch processes can share a directory and never read a partial entry. A hit
+touches the entry, and when the directory grows past max_bytes the least
+recently used entries are removed until it is under 90% of the cap.
+Temporary files left behind by a process that died mid-write are removed
+by prune and clear once they are TEMPORARY_AGE seconds old.
+"""
+import errno
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+# The modules whose code decides what a formula's SVG body looks like: both
+# parsers (and the lexer), every layout backend and their renderers, and
+# gen.py, which picks the backend and drives it.
+FINGERPRINTED = ('lexer.py', 'parser.py', 'fastparse.py', 'layout.py', 'compact.py', 'memo.py',
+                 'gen.py')
+
+BACKENDS = ('tree', 'arrays', 'memo')
+
+# A temporary file this old belongs to no live writer.
+TEMPORARY_AGE = 3600
+
+
+def code_fingerprint():
+    digest = hashlib.sha1()
+    for name in FINGERPRINTED:
+        with open(os.path.join(here, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _entries(directory):
+    # (path, size, mtime) of every entry, skipping temporary files.
+    for shard in os.listdir(directory):
+        shard_dir = os.path.join(directory, shard)
+        if not os.path.isdir(shard_dir):
+            continue
+        for name in os.listdir(shard_dir):
+            if not name.endswith('.svg'):
+                continue
+            path = os.path.join(shard_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Evicted by another process.
+                continue
+            yield path, stat.st_size, stat.st_mtime
+
+
+def _temporaries(directory, now):
+    # Temporary files older than TEMPORARY_AGE.
+    for shard in os.listdir(directory):
+        shard_dir = os.path.join(directory, shard)
+        if not os.path.isdir(shard_dir):
+            continue
+        for name in os.listdir(shard_dir):
+            if not name.endswith('.tmp'):
+                continue
+            path = os.path.join(shard_dir, name)
+            try:
+                if now - os.stat(path).st_mtime > TEMPORARY_AGE:
+                    yield path
+            except OSError:
+                continue
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+
+
+class RenderCache(object):
+    def __init__(self, directory, max_bytes=256 << 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.fingerprint = code_fingerprint()
+        self.hits = self.misses = self.writes = self.evictions = 0
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+        self._size = sum(size for _, size, _ in _entries(directory))
+
+    def key(self, formula, backend='tree'):
+        if backend not in BACKENDS:
+            raise ValueError('unknown layout backend: %r' % (backend,))
+        digest = hashlib.sha1(self.fingerprint)
+        digest.update(backend)
+        digest.update('\0')
+        digest.update(formula)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.svg')
+
+    def get(self, formula, backend='tree'):
+        """Return the SVG body of formula rendered by backend, or None."""
+        path = self._path(self.key(formula, backend))
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return body
+
+    def put(self, formula, body, backend='tree'):
+        path = self._path(self.key(formula, backend))
+        shard_dir = os.path.dirname(path)
+        if not os.path.isdir(shard_dir):
+            try:
+                os.mkdir(shard_dir)
+            except OSError:
+                if not os.path.isdir(shard_dir):
+                    raise
+        fd, temporary = tempfile.mkstemp(dir=shard_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(body)
+            os.rename(temporary, path)
+        except Exception:
+            _remove(temporary)
+            raise
+        self.writes += 1
+        self._size += len(body)
+        if self._size > self.max_bytes:
+            self.prune()
+
+    def prune(self):
+        """Remove the least recently used entries until the cache is under
+        90% of max_bytes. Other processes may be writing too, so the size is
+        recounted from the directory first."""
+        for path in _temporaries(self.directory, time.time()):
+            _remove(path)
+        entries = sorted(_entries(self.directory), key=lambda entry: entry[2])
+        size = sum(entry_size for _, entry_size, _ in entries)
+        target = self.max_bytes * 9 // 10
+        for path, entry_size, _ in entries:
+            if size <= target:
+                break
+            _remove(path)
+            size -= entry_size
+            self.evictions += 1
+        self._size = size
+
+
+def stats(directory):
+    entries = list(_entries(directory))
+    size = sum(entry_size for _, entry_size, _ in entries)
+    print 'entries      %d' % len(entries)
+    print 'size         %.1f KB' % (size / 1024.0)
+    if entries:
+        mtimes = [mtime for _, _, mtime in entries]
+        print 'average      %.1f KB' % (size / 1024.0 / len(entries))
+        print 'oldest used  %s' % time.ctime(min(mtimes))
+        print 'newest used  %s' % time.ctime(max(mtimes))
+
+
+def clear(directory):
+    removed = 0
+    for path, _, _ in list(_entries(directory)):
+        _remove(path)
+        removed += 1
+    for path in list(_temporaries(directory, time.time())):
+        _remove(path)
+    print 'removed %d entries' % removed
+
+
+def main():
+    if len(sys.argv) != 3 or sys.argv[1] not in ('stats', 'clear'):
+        sys.stderr.write(__doc__.split('\n\n')[1] + '\n')
+        return 2
+    command, directory = sys.argv[1:]
+    if not os.path.isdir(directory):
+        sys.stderr.write('%s is not a directory\n' % directory)
+        return 1
+    if command == 'stats':
+        stats(directory)
+    else:
+        clear(directory)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())